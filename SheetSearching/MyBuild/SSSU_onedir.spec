@@ -0,0 +1,57 @@
+# -*- mode: python ; coding: utf-8 -*-
+# Startup-optimized build of the GUI (see 打包使用的命令.txt):
+# - onedir: nothing has to be unpacked to a temp folder at every launch
+# - hook-pandas.py next to the script trims pandas to what it needs at run time
+# - libraries pandas can use but this program never does are left out (jinja2
+#   with them, so hook-pandas.py bundles no Styler templates either)
+import os
+import sys
+import importlib.util
+
+from PyInstaller.utils.hooks import collect_submodules
+
+project_dir = os.path.dirname(SPECPATH)
+sys.path.insert(0, project_dir)
+icon_path = os.path.join(os.path.dirname(project_dir), 'app_icon.ico')
+
+# sheetsearch loads its submodules by name on first use, which the import scan cannot follow
+hiddenimports = collect_submodules('sheetsearch')
+# Engines and optional packages are imported by name too; bundle the installed ones
+for package in ('openpyxl', 'xlrd', 'odf', 'pyxlsb', 'opencc', 'regex'):
+    if importlib.util.find_spec(package) is not None:
+        hiddenimports.append(package)
+
+excludes = [
+    'pandas.tests', 'numpy.tests', 'openpyxl.tests',
+    'matplotlib', 'scipy', 'IPython', 'jinja2', 'pyarrow', 'numba', 'tables',
+    'sqlalchemy', 'fsspec', 'botocore', 'bs4', 'lxml', 'html5lib', 'pytest',
+]
+
+a = Analysis(
+    [os.path.join(project_dir, 'SSSUv0.7u2.py')],
+    pathex=[project_dir],
+    hiddenimports=hiddenimports,
+    hookspath=[project_dir],
+    excludes=excludes,
+    noarchive=False,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='Excel多表搜索工具',
+    console=False,
+    # UPX-compressed DLLs have to be unpacked in memory at every start
+    upx=False,
+    icon=icon_path if os.path.exists(icon_path) else None,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    upx=False,
+    name='Excel多表搜索工具',
+)
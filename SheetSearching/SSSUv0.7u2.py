@@ -1,16 +1,38 @@
-import pandas as pd
+import time
+# Startup time is measured from here (see --startup-time)
+STARTUP_CLOCK = time.perf_counter()
+
 import tkinter as tk
 from tkinter import filedialog, messagebox
+import tkinter.font as tkfont
+import unicodedata
 import customtkinter as ctk
 from PIL import Image
 import sys
 import os
-import glob
 from pathlib import Path
-import importlib.util
-import tempfile
-import shutil
-import time
+import subprocess
+import threading
+import queue
+import multiprocessing
+
+# The search itself lives in the GUI-free sheetsearch package next to this script.
+# Only names that do not import pandas are imported here, so the window opens
+# at once; the rest are imported where they are used, after preload() has
+# loaded them in the background.
+import sheetsearch
+from sheetsearch import (
+    DiskSheetCache,
+    SEARCH_MODES,
+    STOP_MODES,
+    EXCEL_EXTENSIONS,
+    SheetCache,
+    compare_workbook_loading,
+    default_worker_count,
+    get_app_data_dir,
+    iter_excel_files,
+    variant_folding_available
+)
 
 # Set appearance mode and default color theme
 ctk.set_appearance_mode("System")  # Modes: "System", "Dark", "Light"
@@ -26,260 +48,276 @@ def resource_path(relative_path):
 
     return os.path.join(base_path, relative_path)
 
-def is_package_installed(package_name):
-    """Check if a package is installed"""
-    return importlib.util.find_spec(package_name) is not None
-
-def get_available_engines():
-    """Return a list of available Excel engines based on installed packages"""
-    engines = []
-
-    # Always include default engine
-    engines.append({'engine': 'openpyxl', 'options': {}})
-    engines.append({'engine': 'openpyxl', 'options': {'read_only': True, 'data_only': True}})
-
-    # Check for other engines
-    if is_package_installed('xlrd'):
-        engines.append({'engine': 'xlrd', 'options': {}})
-
-    if is_package_installed('pyxlsb'):
-        engines.append({'engine': 'pyxlsb', 'options': {}})
-
-    if is_package_installed('odf'):
-        engines.append({'engine': 'odf', 'options': {}})
-
-    return engines
-
-def read_problematic_excel(file_path):
+def hits_row_source(hits):
     """
-    Special method for handling problematic Excel files by creating a temporary copy.
-    This simulates the "copy-paste to new file" approach that fixed the original issue.
+    Adapt SheetHits to VirtualTable: returns (headers, row_count, fetch_rows, rows_ready)
+    where fetch_rows(start, stop) returns [(row_label, [cell, ...], hit_columns), ...]
+    with hit_columns the positions of the hit cells among the displayed cells,
+    and rows_ready(start, stop) tells whether that needs no workbook read.
+    Only the requested slice is loaded, never the whole sheet.
     """
-    tmp_path = None
-    try:
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as tmp_file:
-            tmp_path = tmp_file.name
-
-        # Copy the original file to the temporary location
-        shutil.copy2(file_path, tmp_path)
-
-        # Try to read with pandas from the temporary file
-        # First try to get sheet names
-        xl = pd.ExcelFile(tmp_path)
-        sheet_names = xl.sheet_names
-
-        results = {}
-        for sheet_name in sheet_names:
-            df = pd.read_excel(
-                tmp_path,
-                sheet_name=sheet_name,
-                header=None,
-                dtype=str,
-                na_filter=False
-            )
-            results[sheet_name] = df
+    from sheetsearch import column_letter
 
-        # Clean up the temporary file
-        if tmp_path and os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+    tag_count = len(hits.tags)
+    headers = list(hits.tags) + [column_letter(column) for column in range(hits.width)]
 
-        return results
-
-    except Exception as e:
-        # Clean up if still exists
-        if tmp_path and os.path.exists(tmp_path):
-            try:
-                os.unlink(tmp_path)
-            except:
-                pass
-        raise e
-
-def repair_excel_with_com(file_path):
+    def fetch_rows(start, stop):
+        try:
+            block = hits.load_rows(start, stop)
+        except Exception as e:
+            # The workbook may have been moved or changed since the search
+            return [(str(row + 1), [f"无法读取: {str(e)}"], []) for row in hits.rows[start:stop].tolist()]
+        return [
+            (str(row + 1), values, [tag_count + col for col in hits.row_hit_columns(row)])
+            for row, values in zip(block.index.tolist(), block.to_numpy(dtype=object).tolist())
+        ]
+
+    return headers, len(hits), fetch_rows, hits.rows_loaded
+
+def open_workbook_at(file_path, sheet_name, address):
     """
-    Repair Excel file using Excel's COM interface.
-    This simulates opening the file in Excel and saving it as a new file.
+    Open a workbook in Excel with the given cell selected. Without Excel
+    automation (pywin32) the file is just opened with its default program.
+    Returns True if the cell could be selected.
     """
+    file_path = os.path.abspath(file_path)
     try:
         import win32com.client
-    except ImportError:
-        raise ImportError("需要安装pywin32库才能进行Excel修复。请运行: pip install pywin32")
-
-    tmp_path = None
-    excel_app = None
 
-    try:
-        # Create a temporary file path for the repaired file
-        tmp_fd, tmp_path = tempfile.mkstemp(suffix='.xlsx')
-        os.close(tmp_fd)
-
-        # Create Excel application
         excel_app = win32com.client.Dispatch("Excel.Application")
-        excel_app.DisplayAlerts = False  # Don't show alerts
-        excel_app.Visible = False        # Don't show Excel
-
-        # Open the problematic file
-        workbook = excel_app.Workbooks.Open(os.path.abspath(file_path))
-
-        # Save as new file (this is the repair step)
-        workbook.SaveAs(os.path.abspath(tmp_path))
-        workbook.Close()
-
-        # Read the repaired file with pandas
-        xl = pd.ExcelFile(tmp_path)
-        sheet_names = xl.sheet_names
-
-        results = {}
-        for sheet_name in sheet_names:
-            df = pd.read_excel(
-                tmp_path,
-                sheet_name=sheet_name,
-                header=None,
-                dtype=str,
-                na_filter=False
-            )
-            results[sheet_name] = df
-
-        return results
-
-    except Exception as e:
-        raise Exception(f"Excel COM修复失败: {str(e)}")
-
-    finally:
-        # Clean up resources
-        if excel_app:
-            excel_app.Quit()
-
-        # Clean up the temporary file
-        if tmp_path and os.path.exists(tmp_path):
-            try:
-                os.unlink(tmp_path)
-            except:
-                pass
-
-def search_excel_files(file_paths, search_term, case_sensitive=False):
-    all_results = {}
-    available_engines = get_available_engines()
-
-    for file_path in file_paths:
-        file_name = Path(file_path).name
-        file_results = {}
-        sheet_errors = []
-        last_error = ""
-
-        # Step 1: Try all standard engines
-        for engine_config in available_engines:
-            engine = engine_config['engine']
-            options = engine_config['options']
-
-            try:
-                # 尝试先获取表名
-                xl = pd.ExcelFile(file_path, engine=engine, **options)
-                sheet_names = xl.sheet_names
-
-                for sheet_name in sheet_names:
-                    try:
-                        # 使用严格的文本模式读取数据
-                        df = pd.read_excel(
-                            file_path,
-                            sheet_name=sheet_name,
-                            engine=engine,
-                            header=None,
-                            dtype=str,
-                            na_filter=False,
-                            keep_default_na=False,
-                            **options
-                        )
-
-                        # 优化搜索逻辑
-                        mask = df.apply(
-                            lambda row: row.astype(str).str.contains(
-                                search_term,
-                                case=case_sensitive,
-                                regex=False,
-                                na=False
-                            ).any(),
-                            axis=1
-                        )
-                        result = df[mask]
-
-                        if not result.empty:
-                            file_results[sheet_name] = result
-
-                    except Exception as e:
-                        sheet_errors.append(f"[{sheet_name}] {str(e)}")
-                        continue
-
-                if file_results:
-                    all_results[file_name] = file_results
-                    break  # 找到结果就停止尝试其他引擎
-
-            except Exception as e:
-                last_error = str(e)
-                continue
-
-        # Step 2: If all standard approaches failed, try the temp file approach
-        if not file_results:
-            try:
-                # Try the temporary file approach
-                repaired_sheets = read_problematic_excel(file_path)
-
-                # Search in the repaired data
-                for sheet_name, df in repaired_sheets.items():
-                    mask = df.apply(
-                        lambda row: row.astype(str).str.contains(
-                            search_term,
-                            case=case_sensitive,
-                            regex=False,
-                            na=False
-                        ).any(),
-                        axis=1
-                    )
-                    result = df[mask]
+        excel_app.Visible = True
+        workbook = excel_app.Workbooks.Open(file_path)
+        worksheet = workbook.Worksheets(sheet_name)
+        worksheet.Activate()
+        worksheet.Range(address).Select()
+        return True
+    except Exception:
+        pass
 
-                    if not result.empty:
-                        file_results[sheet_name] = result
+    if sys.platform == 'win32':
+        os.startfile(file_path)
+    elif sys.platform == 'darwin':
+        subprocess.Popen(['open', file_path])
+    else:
+        subprocess.Popen(['xdg-open', file_path])
+    return False
 
-                if file_results:
-                    all_results[file_name] = file_results
+class VirtualTable(ctk.CTkFrame):
+    """
+    Read-only table that draws only the rows currently visible on a canvas.
+    Scrolling maps the scrollbar fraction straight to a first row index, so
+    the render cost is the same for 10 rows or 1,000,000.
+    fetch_rows may return a third item per row, the positions of cells to
+    highlight; on_activate(row_index) is called on a double-click.
+    With rows_ready(start, stop), rows it reports as not ready are fetched on a
+    worker thread a block at a time, so a slow source never blocks the window.
+    """
 
-            except Exception as e:
-                last_error = f"{last_error}; 常规修复尝试失败: {str(e)}"
+    ROW_HEIGHT = 22
+    MAX_COLUMN_WIDTH = 320
+    LABEL_COLUMN = "行号"
+    LOAD_BLOCK = 2000
+    LOADING_TEXT = "读取中…"
+
+    def __init__(self, master, headers, row_count, fetch_rows, rows_ready=None, on_activate=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.headers = [self.LABEL_COLUMN] + list(headers)
+        self.row_count = row_count
+        self.fetch_rows = fetch_rows
+        self.rows_ready = rows_ready
+        self.on_activate = on_activate
+        self.first_row = 0
+        # Background row loading: the block last fetched there ((start, stop, rows),
+        # kept so failed reads still show), the range being fetched and its queue
+        self.loaded_block = None
+        self.loading = None
+        self.load_queue = queue.Queue()
+        self.load_poll_id = None
+
+        self.font = tkfont.Font(family="Consolas", size=11)
+        self.header_font = tkfont.Font(family="Consolas", size=11, weight="bold")
+        self.char_width = max(self.font.measure("0"), 1)
+        self.column_widths = self._measure_columns()
+        self.total_width = sum(self.column_widths)
+
+        dark = ctk.get_appearance_mode() == "Dark"
+        self.colors = {
+            'background': "#2b2b2b" if dark else "#ffffff",
+            'stripe': "#323232" if dark else "#f3f6fa",
+            'header': "#3a3a3a" if dark else "#e4e9f0",
+            'grid': "#444444" if dark else "#d0d7de",
+            'hit': "#6b5a1e" if dark else "#fff2a8",
+            'text': "#ffffff" if dark else "#000000"
+        }
+
+        self.header_canvas = tk.Canvas(self, height=self.ROW_HEIGHT, highlightthickness=0,
+                                       background=self.colors['header'])
+        self.body_canvas = tk.Canvas(self, highlightthickness=0, background=self.colors['background'])
+        self.y_scrollbar = ctk.CTkScrollbar(self, orientation="vertical", command=self._on_yscroll)
+        self.x_scrollbar = ctk.CTkScrollbar(self, orientation="horizontal", command=self._on_xscroll)
+
+        self.header_canvas.grid(row=0, column=0, sticky="ew")
+        self.body_canvas.grid(row=1, column=0, sticky="nsew")
+        self.y_scrollbar.grid(row=1, column=1, sticky="ns")
+        self.x_scrollbar.grid(row=2, column=0, sticky="ew")
+        self.grid_rowconfigure(1, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        for canvas in (self.header_canvas, self.body_canvas):
+            canvas.configure(scrollregion=(0, 0, self.total_width, 0), xscrollcommand=self.x_scrollbar.set)
+
+        self.body_canvas.bind("<Configure>", lambda event: self._redraw())
+        self.body_canvas.bind("<MouseWheel>", self._on_mousewheel)
+        self.body_canvas.bind("<Shift-MouseWheel>", self._on_shift_mousewheel)
+        self.body_canvas.bind("<Button-4>", lambda event: self._scroll_rows(-3))
+        self.body_canvas.bind("<Button-5>", lambda event: self._scroll_rows(3))
+        self.body_canvas.bind("<Double-Button-1>", self._on_double_click)
+        self._draw_header()
+
+    def _text_units(self, text):
+        # Wide (CJK) characters take two character cells in a monospace font
+        return sum(2 if unicodedata.east_asian_width(char) in ("W", "F") else 1 for char in text)
+
+    def _measure_columns(self, sample_size=200):
+        """Column widths from the header and a small sample of rows"""
+        units = [self._text_units(header) for header in self.headers]
+        sample_size = min(sample_size, self.row_count)
+        if self.rows_ready is not None and not self.rows_ready(0, sample_size):
+            sample_size = 0
+        for row in self.fetch_rows(0, sample_size):
+            for col, text in enumerate([row[0]] + list(row[1])):
+                units[col] = max(units[col], self._text_units(str(text)))
+        return [min(max(unit, 4) * self.char_width + 16, self.MAX_COLUMN_WIDTH) for unit in units]
+
+    def _fit_text(self, text, width):
+        max_units = (width - 12) // self.char_width
+        if self._text_units(text) <= max_units:
+            return text
+        fitted = []
+        used = 0
+        for char in text:
+            used += 2 if unicodedata.east_asian_width(char) in ("W", "F") else 1
+            if used > max_units - 1:
+                break
+            fitted.append(char)
+        return "".join(fitted) + "…"
+
+    def _visible_row_count(self):
+        return max(self.body_canvas.winfo_height() // self.ROW_HEIGHT, 1)
+
+    def _draw_header(self):
+        canvas = self.header_canvas
+        canvas.delete("all")
+        x = 0
+        for header, width in zip(self.headers, self.column_widths):
+            canvas.create_rectangle(x, 0, x + width, self.ROW_HEIGHT, fill=self.colors['header'],
+                                    outline=self.colors['grid'])
+            canvas.create_text(x + 6, self.ROW_HEIGHT // 2, text=self._fit_text(header, width), anchor="w",
+                               font=self.header_font, fill=self.colors['text'])
+            x += width
+
+    def _redraw(self):
+        canvas = self.body_canvas
+        canvas.delete("all")
+        visible = self._visible_row_count()
+        self.first_row = max(min(self.first_row, self.row_count - visible), 0)
+        stop = min(self.first_row + visible + 1, self.row_count)
+
+        for offset, row in enumerate(self._visible_rows(self.first_row, stop)):
+            label, values = row[0], row[1]
+            y = offset * self.ROW_HEIGHT
+            fill = self.colors['stripe'] if (self.first_row + offset) % 2 else self.colors['background']
+            canvas.create_rectangle(0, y, self.total_width, y + self.ROW_HEIGHT, fill=fill, width=0)
+            # Hit cells get a highlight under their text (+1 skips the row label column)
+            for col in (row[2] if len(row) > 2 else ()):
+                if col + 1 < len(self.column_widths):
+                    left = sum(self.column_widths[:col + 1])
+                    canvas.create_rectangle(left, y, left + self.column_widths[col + 1], y + self.ROW_HEIGHT,
+                                            fill=self.colors['hit'], width=0)
+            x = 0
+            for text, width in zip([label] + list(values), self.column_widths):
+                canvas.create_text(x + 6, y + self.ROW_HEIGHT // 2, text=self._fit_text(str(text), width),
+                                   anchor="w", font=self.font, fill=self.colors['text'])
+                canvas.create_line(x + width, y, x + width, y + self.ROW_HEIGHT, fill=self.colors['grid'])
+                x += width
+
+        if self.row_count:
+            self.y_scrollbar.set(self.first_row / self.row_count, min(stop / self.row_count, 1.0))
+        else:
+            self.y_scrollbar.set(0, 1)
+
+    def _visible_rows(self, start, stop):
+        """Rows to draw now; rows that need a slow read show a placeholder until loaded"""
+        if self.rows_ready is None or self.rows_ready(start, stop):
+            return self.fetch_rows(start, stop)
+        if self.loaded_block is not None:
+            block_start, block_stop, rows = self.loaded_block
+            if block_start <= start and stop <= block_stop:
+                return rows[start - block_start:stop - block_start]
+        self._request_rows(start, stop)
+        return [("", [self.LOADING_TEXT]) for _ in range(stop - start)]
+
+    def _request_rows(self, start, stop):
+        if self.loading is not None:
+            # The running load ends with a redraw, which asks again if still needed
+            return
+        # A whole block around the screen, so scrolling on does not read again at once
+        start = max(min(start - self.LOAD_BLOCK // 4, self.row_count - self.LOAD_BLOCK), 0)
+        stop = min(start + self.LOAD_BLOCK, self.row_count)
+        self.loading = (start, stop)
 
-        # Step 3: If all previous approaches failed, try using Excel COM automation
-        if not file_results:
+        def load():
             try:
-                # Try Excel COM automation repair
-                excel_repaired_sheets = repair_excel_with_com(file_path)
-
-                # Search in the Excel-repaired data
-                for sheet_name, df in excel_repaired_sheets.items():
-                    mask = df.apply(
-                        lambda row: row.astype(str).str.contains(
-                            search_term,
-                            case=case_sensitive,
-                            regex=False,
-                            na=False
-                        ).any(),
-                        axis=1
-                    )
-                    result = df[mask]
-
-                    if not result.empty:
-                        file_results[sheet_name] = result
-
-                if file_results:
-                    all_results[file_name] = file_results
-
+                rows = self.fetch_rows(start, stop)
             except Exception as e:
-                last_error = f"{last_error}; Excel COM修复尝试失败: {str(e)}"
+                rows = [("", [f"无法读取: {str(e)}"]) for _ in range(stop - start)]
+            self.load_queue.put((start, stop, rows))
 
-        # Record errors if all attempts failed
-        if not file_results:
-            error_msg = last_error if last_error else "；".join(sheet_errors) if sheet_errors else "未知错误"
-            all_results[file_name] = {"error": f"所有解析方式失败: {error_msg}"}
+        threading.Thread(target=load, daemon=True).start()
+        self.load_poll_id = self.after(50, self._poll_rows)
 
-    return all_results
+    def _poll_rows(self):
+        try:
+            self.loaded_block = self.load_queue.get_nowait()
+        except queue.Empty:
+            self.load_poll_id = self.after(50, self._poll_rows)
+            return
+        self.load_poll_id = None
+        self.loading = None
+        self._redraw()
+
+    def destroy(self):
+        if self.load_poll_id is not None:
+            self.after_cancel(self.load_poll_id)
+            self.load_poll_id = None
+        super().destroy()
+
+    def _scroll_rows(self, delta):
+        self.first_row += delta
+        self._redraw()
+
+    def _on_yscroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.first_row = int(float(amount) * self.row_count)
+        elif action == "scroll":
+            step = self._visible_row_count() if unit == "pages" else 1
+            self.first_row += int(amount) * step
+        self._redraw()
+
+    def _on_xscroll(self, *args):
+        self.header_canvas.xview(*args)
+        self.body_canvas.xview(*args)
+
+    def _on_mousewheel(self, event):
+        self._scroll_rows(-3 if event.delta > 0 else 3)
+
+    def _on_shift_mousewheel(self, event):
+        self._on_xscroll("scroll", -1 if event.delta > 0 else 1, "units")
+
+    def _on_double_click(self, event):
+        row_index = self.first_row + int(self.body_canvas.canvasy(event.y)) // self.ROW_HEIGHT
+        if self.on_activate is not None and row_index < self.row_count:
+            self.on_activate(row_index)
 
 class ModernExcelSearchApp(ctk.CTk):
     def __init__(self):
@@ -306,15 +344,96 @@ class ModernExcelSearchApp(ctk.CTk):
 
         # Initialize variables
         self.file_paths = []
+        # Same paths as a set: folder scans check tens of thousands of files against it
+        self.file_path_set = set()
+        self.folders = []
+        self.include_patterns = ctk.StringVar()
+        self.exclude_patterns = ctk.StringVar()
+        self.scan_subfolders = ctk.BooleanVar(value=True)
         self.search_term = ctk.StringVar()
         self.case_sensitive = ctk.BooleanVar(value=False)
+        self.search_mode = ctk.StringVar(value="普通")
+        self.max_distance = ctk.StringVar(value="1")
+        self.fold_variants = ctk.BooleanVar(value=False)
+        self.stop_mode = ctk.StringVar(value="全部结果")
+        self.max_hits = ctk.StringVar(value="100")
+        self.workers = ctk.StringVar(value=str(default_worker_count()))
+        self.use_index = ctk.BooleanVar(value=False)
+        self.cache_limit = ctk.StringVar(value="512")
+        self.use_disk_cache = ctk.BooleanVar(value=True)
+        self.sheet_cache = SheetCache(max_mb=512, disk_cache=DiskSheetCache())
+        self.cache_status = ctk.StringVar(value=self.sheet_cache.summary())
         self.status = ctk.StringVar(value="就绪")
 
+        # Background search state
+        self.search_queue = queue.Queue()
+        self.search_thread = None
+        self.cancel_event = None
+        self.search_totals = None
+        self.index_totals = None
+
+        # Folder scans run alongside everything else and feed the file list in batches
+        self.scan_queue = queue.Queue()
+        self.scan_cancel = threading.Event()
+        self.scans_running = 0
+        self.scan_found = 0
+        self.scan_errors = 0
+
+        # Startup: pandas and the engines are imported in the background once the window is up
+        self.report_startup = False
+        self.startup_times = {}
+        self.preload_done = threading.Event()
+        self.preload_error = None
+
         # Build the interface
         self._create_sidebar()
         self._create_main_content()
         self._create_bottom_bar()
 
+        self.search_button.configure(state="disabled")
+        self.status.set("正在加载搜索组件...")
+        self.after_idle(self._start_preload)
+
+    def _start_preload(self):
+        # First idle moment: the window has been drawn
+        self.startup_times['window'] = time.perf_counter() - STARTUP_CLOCK
+        threading.Thread(target=self._preload_worker, daemon=True).start()
+        self.after(50, self._check_preload)
+
+    def _preload_worker(self):
+        """Runs in a background thread and must not touch any widget"""
+        try:
+            sheetsearch.preload()
+        except Exception as e:
+            self.preload_error = str(e)
+        self.preload_done.set()
+
+    def _check_preload(self):
+        if not self.preload_done.is_set():
+            self.after(50, self._check_preload)
+            return
+        self.startup_times['ready'] = time.perf_counter() - STARTUP_CLOCK
+        if self.preload_error is not None:
+            self.status.set(f"加载搜索组件失败: {self.preload_error}")
+            return
+        self.search_button.configure(state="normal")
+        self.status.set("就绪")
+        if self.report_startup:
+            self._report_startup_time()
+
+    def _report_startup_time(self):
+        """--startup-time: record how long the window and the search took to be ready, then quit"""
+        times = self.startup_times
+        line = (f"{time.strftime('%Y-%m-%d %H:%M:%S')} 启动耗时: 窗口显示 {times['window']:.2f} 秒, "
+                f"搜索可用 {times['ready']:.2f} 秒 (从解释器启动计; 打包程序的解压时间请在外部计时)")
+        # A windowed build has no console; the log file is next to the other app data
+        with open(os.path.join(get_app_data_dir(), "startup_time.log"), "a", encoding="utf-8") as handle:
+            handle.write(line + "\n")
+        if sys.stdout is not None:
+            print(line)
+        self.status.set(line)
+        self.after(500, self.destroy)
+
     def _create_sidebar(self):
         """Left sidebar navigation"""
         self.sidebar = ctk.CTkFrame(self, width=240, corner_radius=0)
@@ -444,6 +563,52 @@ class ModernExcelSearchApp(ctk.CTk):
         )
         clear_btn.pack(side="left", padx=5)
 
+        index_btn = ctk.CTkButton(
+            buttons_frame,
+            text="建立/更新索引",
+            command=self.build_index,
+            fg_color="transparent",
+            text_color=("gray10", "gray90"),
+            border_width=1,
+            hover_color=("gray70", "gray30")
+        )
+        index_btn.pack(side="right", padx=5)
+
+        # Folder scan filters
+        filter_frame = ctk.CTkFrame(file_frame)
+        filter_frame.pack(fill="x", padx=10, pady=(0, 10))
+
+        include_label = ctk.CTkLabel(filter_frame, text="包含:")
+        include_label.pack(side="left", padx=(5, 5))
+
+        include_entry = ctk.CTkEntry(
+            filter_frame,
+            textvariable=self.include_patterns,
+            placeholder_text="如 *2024*;报表/*",
+            width=180,
+            height=32
+        )
+        include_entry.pack(side="left", padx=5)
+
+        exclude_label = ctk.CTkLabel(filter_frame, text="排除:")
+        exclude_label.pack(side="left", padx=(10, 5))
+
+        exclude_entry = ctk.CTkEntry(
+            filter_frame,
+            textvariable=self.exclude_patterns,
+            placeholder_text="如 备份;*旧*",
+            width=180,
+            height=32
+        )
+        exclude_entry.pack(side="left", padx=5)
+
+        subfolders_check = ctk.CTkCheckBox(
+            filter_frame,
+            text="包含子文件夹",
+            variable=self.scan_subfolders
+        )
+        subfolders_check.pack(side="left", padx=10)
+
         # Search section
         search_frame = ctk.CTkFrame(self.search_tab)
         search_frame.pack(fill="x", padx=10, pady=10, expand=False)
@@ -470,6 +635,51 @@ class ModernExcelSearchApp(ctk.CTk):
         )
         search_entry.pack(side="left", padx=5, fill="x", expand=True)
 
+        mode_menu = ctk.CTkOptionMenu(
+            search_input_frame,
+            variable=self.search_mode,
+            values=list(SEARCH_MODES),
+            width=80
+        )
+        mode_menu.pack(side="left", padx=5)
+
+        distance_label = ctk.CTkLabel(search_input_frame, text="编辑距离:")
+        distance_label.pack(side="left", padx=(10, 5))
+
+        distance_menu = ctk.CTkOptionMenu(
+            search_input_frame,
+            variable=self.max_distance,
+            values=["1", "2", "3"],
+            width=60
+        )
+        distance_menu.pack(side="left", padx=5)
+
+        stop_label = ctk.CTkLabel(search_input_frame, text="结果:")
+        stop_label.pack(side="left", padx=(10, 5))
+
+        stop_menu = ctk.CTkOptionMenu(
+            search_input_frame,
+            variable=self.stop_mode,
+            values=list(STOP_MODES),
+            width=110
+        )
+        stop_menu.pack(side="left", padx=5)
+
+        max_hits_entry = ctk.CTkEntry(search_input_frame, textvariable=self.max_hits, width=60, height=32)
+        max_hits_entry.pack(side="left", padx=5)
+
+        terms_btn = ctk.CTkButton(
+            search_input_frame,
+            text="导入词表",
+            command=self.import_terms,
+            fg_color="transparent",
+            text_color=("gray10", "gray90"),
+            border_width=1,
+            hover_color=("gray70", "gray30"),
+            width=80
+        )
+        terms_btn.pack(side="left", padx=5)
+
         # Search options
         options_frame = ctk.CTkFrame(search_frame)
         options_frame.pack(fill="x", padx=10, pady=10)
@@ -481,7 +691,65 @@ class ModernExcelSearchApp(ctk.CTk):
         )
         case_check.pack(side="left", padx=5)
 
-        search_btn = ctk.CTkButton(
+        variants_check = ctk.CTkCheckBox(
+            options_frame,
+            text="繁简通用",
+            variable=self.fold_variants,
+            state="normal" if variant_folding_available() else "disabled"
+        )
+        variants_check.pack(side="left", padx=5)
+
+        index_check = ctk.CTkCheckBox(
+            options_frame,
+            text="使用索引",
+            variable=self.use_index
+        )
+        index_check.pack(side="left", padx=5)
+
+        workers_label = ctk.CTkLabel(options_frame, text="并行进程数:")
+        workers_label.pack(side="left", padx=(20, 5))
+
+        workers_menu = ctk.CTkOptionMenu(
+            options_frame,
+            variable=self.workers,
+            values=[str(n) for n in range(1, (os.cpu_count() or 1) + 1)],
+            width=70
+        )
+        workers_menu.pack(side="left", padx=5)
+
+        cache_label = ctk.CTkLabel(options_frame, text="缓存上限(MB):")
+        cache_label.pack(side="left", padx=(20, 5))
+
+        cache_menu = ctk.CTkOptionMenu(
+            options_frame,
+            variable=self.cache_limit,
+            values=["关闭", "256", "512", "1024", "2048", "4096"],
+            command=self._change_cache_limit,
+            width=80
+        )
+        cache_menu.pack(side="left", padx=5)
+
+        disk_cache_check = ctk.CTkCheckBox(
+            options_frame,
+            text="磁盘缓存",
+            variable=self.use_disk_cache,
+            command=self._toggle_disk_cache
+        )
+        disk_cache_check.pack(side="left", padx=5)
+
+        clear_cache_btn = ctk.CTkButton(
+            options_frame,
+            text="清除缓存",
+            command=self.clear_cache,
+            fg_color="transparent",
+            text_color=("gray10", "gray90"),
+            border_width=1,
+            hover_color=("gray70", "gray30"),
+            width=80
+        )
+        clear_cache_btn.pack(side="left", padx=5)
+
+        self.search_button = ctk.CTkButton(
             options_frame,
             text="搜索",
             command=self.search,
@@ -489,7 +757,20 @@ class ModernExcelSearchApp(ctk.CTk):
             hover_color="#005fa3",
             width=120
         )
-        search_btn.pack(side="right", padx=5)
+        self.search_button.pack(side="right", padx=5)
+
+        self.cancel_button = ctk.CTkButton(
+            options_frame,
+            text="取消",
+            command=self.cancel_search,
+            fg_color="transparent",
+            text_color=("gray10", "gray90"),
+            border_width=1,
+            hover_color=("gray70", "gray30"),
+            width=80,
+            state="disabled"
+        )
+        self.cancel_button.pack(side="right", padx=5)
 
         # Results section
         results_frame = ctk.CTkFrame(self.search_tab)
@@ -508,6 +789,10 @@ class ModernExcelSearchApp(ctk.CTk):
 
         # This will be created when needed with the search results
         self.result_notebook = None
+        # file_path -> sheet tabview (or count textbox) of its result tab
+        self.result_tabs = {}
+        # Tab label -> full path; files in different folders often share a name
+        self.result_tab_paths = {}
 
     def _create_bottom_bar(self):
         """Bottom status bar"""
@@ -520,7 +805,43 @@ class ModernExcelSearchApp(ctk.CTk):
             anchor="w",
             font=ctk.CTkFont(size=12)
         )
-        self.status_label.pack(fill="x", padx=20)
+        self.status_label.pack(side="left", fill="x", expand=True, padx=20)
+
+        self.progress_bar = ctk.CTkProgressBar(self.status_bar, width=200)
+        self.progress_bar.set(0)
+        self.progress_bar.pack(side="right", padx=20)
+
+        self.cache_label = ctk.CTkLabel(
+            self.status_bar,
+            textvariable=self.cache_status,
+            anchor="e",
+            font=ctk.CTkFont(size=12)
+        )
+        self.cache_label.pack(side="right", padx=10)
+
+    def _change_cache_limit(self, value):
+        # "关闭" only turns off the in-memory layer; the disk cache has its own switch
+        self.sheet_cache.resize(0 if value == "关闭" else int(value))
+        self.cache_status.set(self.sheet_cache.summary())
+
+    def _toggle_disk_cache(self):
+        self.sheet_cache.disk_cache = DiskSheetCache() if self.use_disk_cache.get() else None
+        self.cache_status.set(self.sheet_cache.summary())
+
+    def clear_cache(self):
+        if self.search_thread is not None and self.search_thread.is_alive():
+            self.status.set("请等待当前任务结束后再清除缓存")
+            return
+        self.sheet_cache.clear(disk=True)
+        if self.sheet_cache.disk_cache is None:
+            DiskSheetCache().clear()
+        self.cache_status.set(self.sheet_cache.summary())
+        self.status.set("已清除内存和磁盘缓存")
+
+    def _active_cache(self):
+        if self.cache_limit.get() == "关闭" and self.sheet_cache.disk_cache is None:
+            return None
+        return self.sheet_cache
 
     def _toggle_theme(self):
         """Toggle between light and dark mode"""
@@ -534,106 +855,496 @@ class ModernExcelSearchApp(ctk.CTk):
             foreground="#000000" if new_mode == "Light" else "#ffffff"
         )
 
+    def _add_files(self, file_paths):
+        """Append new paths to the file list; returns how many were new"""
+        new_paths = [file_path for file_path in dict.fromkeys(file_paths) if file_path not in self.file_path_set]
+        self.file_paths.extend(new_paths)
+        self.file_path_set.update(new_paths)
+        if new_paths:
+            # One listbox call per batch
+            self.files_listbox.insert(tk.END, *[Path(file_path).name for file_path in new_paths])
+        return len(new_paths)
+
     def browse_files(self):
-        filenames = filedialog.askopenfilenames(filetypes=[("Excel files", "*.xlsx *.xls")])
+        patterns = " ".join(f"*{extension}" for extension in EXCEL_EXTENSIONS)
+        filenames = filedialog.askopenfilenames(filetypes=[("Excel files", patterns)])
         if filenames:
-            for filename in filenames:
-                if filename not in self.file_paths:
-                    self.file_paths.append(filename)
-                    self.files_listbox.insert(tk.END, Path(filename).name)
+            self._add_files(filenames)
             self.status.set(f"已添加 {len(filenames)} 个文件")
 
+    def _scan_options(self):
+        """Folder scan filters from the file section (see iter_excel_files)"""
+        return {
+            'include': self.include_patterns.get(),
+            'exclude': self.exclude_patterns.get(),
+            'max_depth': None if self.scan_subfolders.get() else 0
+        }
+
     def browse_folder(self):
         folder = filedialog.askdirectory()
-        if folder:
-            excel_files = glob.glob(os.path.join(folder, "*.xlsx")) + glob.glob(os.path.join(folder, "*.xls"))
-            count = 0
-            for file in excel_files:
-                if file not in self.file_paths:
-                    self.file_paths.append(file)
-                    self.files_listbox.insert(tk.END, Path(file).name)
-                    count += 1
-            self.status.set(f"已从文件夹添加 {count} 个Excel文件")
+        if not folder:
+            return
+        if folder not in self.folders:
+            self.folders.append(folder)
+
+        # Walk the tree in the background; the list fills in while the user keeps working
+        threading.Thread(
+            target=self._scan_worker,
+            args=(folder, self._scan_options(), self.scan_queue, self.scan_cancel),
+            daemon=True
+        ).start()
+        self.scans_running += 1
+        if self.scans_running == 1:
+            self.scan_found = 0
+            self.scan_errors = 0
+            self.after(100, self._poll_scan_queue)
+        self.status.set(f"正在扫描文件夹: {folder}")
+
+    @staticmethod
+    def _scan_worker(folder, scan_options, result_queue, cancel_event, batch_size=500, batch_seconds=0.2):
+        """Runs in a background thread and must not touch any widget"""
+        errors = []
+        batch = []
+        last_put = time.perf_counter()
+        try:
+            for file_path in iter_excel_files(folder, errors=errors, **scan_options):
+                if cancel_event.is_set():
+                    return
+                batch.append(file_path)
+                if len(batch) >= batch_size or time.perf_counter() - last_put >= batch_seconds:
+                    result_queue.put(("files", batch))
+                    batch = []
+                    last_put = time.perf_counter()
+        except Exception as e:
+            errors.append(f"{folder}: {str(e)}")
+        finally:
+            if not cancel_event.is_set():
+                result_queue.put(("files", batch))
+                result_queue.put(("scan_done", folder, errors))
+
+    def _poll_scan_queue(self):
+        try:
+            while True:
+                message = self.scan_queue.get_nowait()
+                if message[0] == "files":
+                    self.scan_found += self._add_files(message[1])
+                    if self.scans_running:
+                        self.status.set(f"正在扫描文件夹... 已添加 {self.scan_found} 个Excel文件")
+                elif message[0] == "scan_done":
+                    _, folder, errors = message
+                    self.scans_running -= 1
+                    self.scan_errors += len(errors)
+                    if not self.scans_running:
+                        self.status.set(
+                            f"已从文件夹添加 {self.scan_found} 个Excel文件"
+                            + (f"，{self.scan_errors} 个文件夹无法读取" if self.scan_errors else "")
+                        )
+                        return
+        except queue.Empty:
+            pass
+
+        if self.scans_running:
+            self.after(100, self._poll_scan_queue)
+
+    def import_terms(self):
+        filename = filedialog.askopenfilename(
+            filetypes=[("词表", "*.txt *.csv *.xlsx *.xls"), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+        from sheetsearch import load_term_list
+
+        try:
+            terms = load_term_list(filename)
+        except Exception as e:
+            messagebox.showerror("错误", f"无法读取词表: {str(e)}")
+            return
+        self.search_term.set("; ".join(terms))
+        self.search_mode.set("多词")
+        self.status.set(f"已导入 {len(terms)} 个搜索词")
 
     def clear_files(self):
+        # Running folder scans stop; their queued batches are dropped with the old queue
+        self.scan_cancel.set()
+        self.scan_cancel = threading.Event()
+        self.scan_queue = queue.Queue()
+        self.scans_running = 0
         self.file_paths = []
+        self.file_path_set = set()
+        self.folders = []
         self.files_listbox.delete(0, tk.END)
         self.status.set("已清除文件列表")
 
     def search(self):
-        # Clear previous results by removing the notebook widget if it exists
-        if self.result_notebook is not None:
-            self.result_notebook.destroy()
+        from sheetsearch import make_matcher
+
+        if self.search_thread is not None and self.search_thread.is_alive():
+            return
 
-        file_paths = self.file_paths
+        file_paths = list(self.file_paths)
         search_term = self.search_term.get()
 
         if not file_paths or not search_term:
             self.status.set("请选择Excel文件并提供搜索内容")
             return
 
-        self.status.set("正在搜索...")
-        self.update()  # Update the UI to show status change
-
-        # Perform search
-        results = search_excel_files(file_paths, search_term, self.case_sensitive.get())
-
-        # Check if we got any results
-        if not results:
-            self.status.set("未找到匹配内容")
+        mode = SEARCH_MODES[self.search_mode.get()]
+        max_distance = int(self.max_distance.get())
+        stop = STOP_MODES[self.stop_mode.get()]
+        try:
+            make_matcher(search_term, self.case_sensitive.get(), mode, max_distance, self.fold_variants.get())
+            max_hits = int(self.max_hits.get())
+            if max_hits < 1:
+                raise ValueError
+        except ValueError as e:
+            self.status.set(str(e) or "前N条的N必须是正整数")
             return
 
-        # Create a new notebook for results
-        self.result_notebook = ctk.CTkTabview(self.result_notebook_frame)
-        self.result_notebook.pack(fill="both", expand=True)
-
-        # Display results
-        total_files = len(results)
-        total_sheets = 0
-        total_rows = 0
-
-        for file_name, file_results in results.items():
-            # Create a tab for each file
-            file_tab = self.result_notebook.add(file_name)
+        # Clear previous results by removing the notebook widget if it exists
+        if self.result_notebook is not None:
+            self.result_notebook.destroy()
+            self.result_notebook = None
+        self.result_tabs = {}
+        self.result_tab_paths = {}
+
+        self.search_totals = {
+            'files': 0,
+            'sheets': 0,
+            'rows': 0,
+            'done': 0,
+            'total': len(file_paths),
+            'saved_seconds': 0.0,
+            'stop': stop
+        }
+        self.status.set(f"正在搜索... (0/{len(file_paths)})")
+        self.progress_bar.set(0)
+        self.search_button.configure(state="disabled")
+        self.cancel_button.configure(state="normal")
+
+        # Run the search off the Tk main thread; results come back through the queue
+        self.search_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.search_thread = threading.Thread(
+            target=self._search_worker,
+            args=(file_paths, search_term, self.case_sensitive.get(), int(self.workers.get()),
+                  self.use_index.get(), self._active_cache(),
+                  self.search_queue, self.cancel_event, mode, max_distance, self.fold_variants.get(), stop, max_hits),
+            daemon=True
+        )
+        self.search_thread.start()
+        self.after(100, self._poll_search_queue)
 
-            if "error" not in file_results:
-                file_sheet_count = len(file_results)
-                file_row_count = sum(len(df) for df in file_results.values())
+    @staticmethod
+    def _search_worker(file_paths, search_term, case_sensitive, workers, use_index, cache, result_queue, cancel_event,
+                       mode='literal', max_distance=1, fold_variants=False, stop=None, max_hits=100):
+        """Runs in a background thread and must not touch any widget"""
+        from sheetsearch import SheetHits, SheetIndex, iter_search
 
-                # Create a nested tabview for sheets
-                sheet_tabview = ctk.CTkTabview(file_tab)
-                sheet_tabview.pack(fill="both", expand=True, padx=5, pady=5)
+        index = None
+        events = None
+        try:
+            # SQLite connections belong to the thread that opened them
+            if use_index:
+                index = SheetIndex()
+            events = iter_search(
+                file_paths,
+                search_term,
+                case_sensitive,
+                workers=workers,
+                index=index,
+                cache=cache,
+                mode=mode,
+                max_distance=max_distance,
+                fold_variants=fold_variants,
+                stop=stop,
+                max_hits=max_hits
+            )
+            # Each sheet is shown as soon as it is matched, not when its file is done
+            for event in events:
+                if event[0] == "sheet" and stop != 'count':
+                    # Load the first screen here, so the GUI thread does not parse the workbook
+                    try:
+                        event[3].load_rows(0, SheetHits.PREVIEW_ROWS)
+                    except Exception:
+                        pass
+                result_queue.put(event)
+                if cancel_event.is_set():
+                    break
+            result_queue.put(("done", cancel_event.is_set()))
+        except Exception as e:
+            result_queue.put(("failed", str(e)))
+        finally:
+            # Closing the generator stops the work still running
+            if events is not None:
+                events.close()
+            if index is not None:
+                index.close()
+
+    def build_index(self):
+        if self.search_thread is not None and self.search_thread.is_alive():
+            return
+        if not self.preload_done.is_set():
+            self.status.set("正在加载搜索组件，请稍候...")
+            return
 
-                for sheet_name, df in file_results.items():
-                    # Create tab for each sheet
-                    sheet_tab = sheet_tabview.add(f"{sheet_name} ({len(df)})")
+        file_paths = list(self.file_paths)
+        folders = list(self.folders)
+        if not file_paths and not folders:
+            self.status.set("请先选择要建立索引的Excel文件")
+            return
 
-                    # Create text area for displaying data
-                    text_frame = ctk.CTkFrame(sheet_tab)
-                    text_frame.pack(fill="both", expand=True, padx=5, pady=5)
+        self.index_totals = {'done': 0, 'failed': 0, 'total': max(len(file_paths), 1)}
+        self.status.set("正在更新索引...")
+        self.progress_bar.set(0)
+        self.search_button.configure(state="disabled")
+        self.cancel_button.configure(state="normal")
+
+        self.search_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.search_thread = threading.Thread(
+            target=self._index_worker,
+            args=(folders, file_paths, self.search_queue, self.cancel_event, self._scan_options()),
+            daemon=True
+        )
+        self.search_thread.start()
+        self.after(100, self._poll_search_queue)
 
-                    text_area = ctk.CTkTextbox(text_frame, wrap="none", font=ctk.CTkFont(family="Consolas", size=12))
-                    text_area.pack(fill="both", expand=True)
-                    text_area.insert("1.0", df.to_string())
-                    text_area.configure(state="disabled")
+    @staticmethod
+    def _index_worker(folders, file_paths, result_queue, cancel_event, scan_options=None):
+        """Runs in a background thread and must not touch any widget"""
+        from sheetsearch import SheetIndex
 
-                    total_rows += len(df)
+        try:
+            with SheetIndex() as index:
+                summary = index.update(
+                    folders,
+                    file_paths,
+                    on_file_done=lambda file_path, error: result_queue.put(("indexed", file_path, error)),
+                    cancel_event=cancel_event,
+                    scan_options=scan_options
+                )
+            result_queue.put(("index_done", cancel_event.is_set(), summary))
+        except Exception as e:
+            result_queue.put(("failed", str(e)))
+
+    def cancel_search(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.cancel_button.configure(state="disabled")
+            self.status.set("正在取消...")
+
+    def _poll_search_queue(self):
+        try:
+            while True:
+                message = self.search_queue.get_nowait()
+
+                if message[0] == "indexed":
+                    _, file_path, error = message
+                    totals = self.index_totals
+                    totals['done'] += 1
+                    totals['failed'] += error is not None
+                    self.progress_bar.set(min(totals['done'] / totals['total'], 1.0))
+                    if not self.cancel_event.is_set():
+                        self.status.set(f"正在更新索引... 已解析 {totals['done']} 个文件: {Path(file_path).name}")
+
+                elif message[0] == "index_done":
+                    _, cancelled, summary = message
+                    self._finish_background_task()
+                    prefix = "已取消，" if cancelled else ""
+                    self.status.set(
+                        f"{prefix}索引已更新: 新增 {summary['added']}，更新 {summary['changed']}，"
+                        f"移动 {summary['moved']}，删除 {summary['deleted']}，未变 {summary['unchanged']}"
+                        + (f"，失败 {summary['failed']}" if summary['failed'] else "")
+                    )
+                    return
+
+                elif message[0] == "sheet":
+                    self._add_sheet_result(*message[1:])
+
+                elif message[0] == "error":
+                    self._add_file_error(*message[1:])
+
+                elif message[0] == "file":
+                    totals = self.search_totals
+                    _, file_path, file_stats = message
+                    totals['done'] += 1
+                    if file_stats is not None:
+                        totals['saved_seconds'] += file_stats['saved_seconds']
+                    self.progress_bar.set(totals['done'] / totals['total'])
+                    self.cache_status.set(self.sheet_cache.summary())
+                    if not self.cancel_event.is_set():
+                        self.status.set(f"正在搜索... ({totals['done']}/{totals['total']}) {Path(file_path).name}")
+
+                elif message[0] == "done":
+                    self._finish_search(cancelled=message[1])
+                    return
+
+                elif message[0] == "failed":
+                    self._finish_search(error=message[1])
+                    return
+
+        except queue.Empty:
+            pass
+
+        self.after(100, self._poll_search_queue)
+
+    def _finish_background_task(self):
+        self.search_button.configure(state="normal")
+        self.cancel_button.configure(state="disabled")
+        self.search_thread = None
+
+    def _finish_search(self, cancelled=False, error=None):
+        totals = self.search_totals
+        self._finish_background_task()
+        self.cache_status.set(self.sheet_cache.summary())
+
+        if error is not None:
+            self.status.set(f"搜索失败: {error}")
+        elif totals['files'] == 0:
+            self.status.set("已取消，未找到匹配内容" if cancelled else "未找到匹配内容")
+        elif totals['stop'] == 'exists':
+            prefix = f"已取消（完成 {totals['done']}/{totals['total']} 个文件）: " if cancelled else ""
+            self.status.set(f"{prefix}{totals['files']} 个文件包含匹配内容（每个文件在首个命中处停止）")
+        else:
+            prefix = f"已取消（完成 {totals['done']}/{totals['total']} 个文件）: " if cancelled else ""
+            if totals['stop'] == 'first' and totals['done'] < totals['total']:
+                prefix = f"已找到前 {totals['rows']} 行，提前结束（搜索了 {totals['done']}/{totals['total']} 个文件）: "
+            self.status.set(
+                f"{prefix}在 {totals['files']} 个文件的 {totals['sheets']} 个表中找到 {totals['rows']} 行匹配内容"
+                f"（单次打开工作簿节省约 {totals['saved_seconds']:.2f} 秒）"
+            )
 
-                total_sheets += file_sheet_count
+    def _add_file_tab(self, file_path):
+        """The result tab of a file, created with its first sheet or error"""
+        if self.result_notebook is None:
+            # Create a new notebook for results
+            self.result_notebook = ctk.CTkTabview(self.result_notebook_frame, command=self._show_result_tab_path)
+            self.result_notebook.pack(fill="both", expand=True)
+
+        # CTkTabview refuses a label it already has
+        label = Path(file_path).name
+        number = 1
+        while label in self.result_tab_paths:
+            number += 1
+            label = f"{Path(file_path).name} ({number})"
+        self.result_tab_paths[label] = file_path
+        return self.result_notebook.add(label)
+
+    def _show_result_tab_path(self):
+        file_path = self.result_tab_paths.get(self.result_notebook.get())
+        if file_path is not None:
+            self.status.set(file_path)
+
+    def _add_sheet_result(self, file_path, sheet_name, sheet_hits):
+        """Add one sheet's results as soon as it has been matched"""
+        totals = self.search_totals
+        tab = self.result_tabs.get(file_path)
+        if tab is None:
+            file_tab = self._add_file_tab(file_path)
+            totals['files'] += 1
+            if totals['stop'] == 'count':
+                # Count-only searches keep no rows; list the counts per sheet
+                tab = ctk.CTkTextbox(file_tab, wrap="word", font=ctk.CTkFont(family="Consolas", size=12))
+                tab.configure(state="disabled")
             else:
-                # Display error message
-                text_area = ctk.CTkTextbox(file_tab, wrap="word", font=ctk.CTkFont(family="Consolas", size=12))
-                text_area.pack(fill="both", expand=True, padx=10, pady=10)
-                text_area.insert("1.0", f"处理文件时出错: {file_results['error']}")
-                text_area.configure(state="disabled")
-
-        self.status.set(f"在 {total_files} 个文件的 {total_sheets} 个表中找到 {total_rows} 行匹配内容")
+                # Create a nested tabview for sheets
+                tab = ctk.CTkTabview(file_tab)
+            tab.pack(fill="both", expand=True, padx=5, pady=5)
+            self.result_tabs[file_path] = tab
+
+        if totals['stop'] == 'count':
+            tab.configure(state="normal")
+            tab.insert("end", f"[{sheet_name}] {len(sheet_hits)} 行\n")
+            tab.configure(state="disabled")
+        else:
+            # Create tab for each sheet
+            sheet_tab = tab.add(f"{sheet_name} ({len(sheet_hits)})")
+
+            # Virtualized grid: only the visible rows are ever loaded and rendered;
+            # double-clicking a row opens the workbook at its first hit cell
+            table = VirtualTable(
+                sheet_tab,
+                *hits_row_source(sheet_hits),
+                on_activate=lambda row_index: self._jump_to_hit(file_path, sheet_hits, row_index)
+            )
+            table.pack(fill="both", expand=True, padx=5, pady=5)
+
+        totals['rows'] += len(sheet_hits)
+        totals['sheets'] += 1
+
+    def _add_file_error(self, file_path, message):
+        """Show why a file could not be searched"""
+        tab = self.result_tabs.get(file_path)
+        if tab is None:
+            tab = self._add_file_tab(file_path)
+        elif self.search_totals['stop'] == 'count':
+            tab.configure(state="normal")
+            tab.insert("end", f"处理文件时出错: {message}\n")
+            tab.configure(state="disabled")
+            return
+        else:
+            # Sheets already shown stay; the error gets a tab of its own
+            tab = tab.add("错误")
+        # Display error message
+        text_area = ctk.CTkTextbox(tab, wrap="word", font=ctk.CTkFont(family="Consolas", size=12))
+        text_area.pack(fill="both", expand=True, padx=10, pady=10)
+        text_area.insert("1.0", f"处理文件时出错: {message}")
+        text_area.configure(state="disabled")
+
+    def _jump_to_hit(self, file_path, sheet_hits, row_index):
+        address = sheet_hits.first_address(row_index)
+        try:
+            if open_workbook_at(file_path, sheet_hits.sheet_name, address):
+                self.status.set(f"已在 Excel 中定位: {Path(file_path).name} [{sheet_hits.sheet_name}] {address}")
+            else:
+                self.status.set(f"已打开 {Path(file_path).name}，请手动定位到 [{sheet_hits.sheet_name}] {address}")
+        except Exception as e:
+            self.status.set(f"无法打开文件: {str(e)}")
+
+
+def run_benchmarks(argv):
+    """Command line benchmarks: --bench-load FILE... | --bench-match [ROWS]"""
+    from sheetsearch import benchmark_row_matchers, benchmark_fuzzy_matcher
+
+    if argv[0] == "--bench-match":
+        rows = int(argv[1]) if len(argv) > 1 else 200000
+        result = benchmark_row_matchers(rows=rows)
+        print(
+            f"{result['rows']} 行 x {result['columns']} 列, 命中 {result['hits']} 行: "
+            f"逐行 lambda {result['legacy_seconds']:.3f}s, "
+            f"向量化 {result['vector_seconds']:.3f}s, "
+            f"加速 {result['speedup']:.1f}x"
+        )
+        result = benchmark_fuzzy_matcher(rows=rows // 2)
+        print(
+            f"模糊匹配 {result['rows']} 行 x {result['columns']} 列, 命中 {result['hits']} 行: "
+            f"首次查询 {result['first_seconds']:.3f}s, "
+            f"缓存表再次查询 {result['cached_seconds']:.3f}s"
+        )
+    elif argv[0] == "--bench-load":
+        for file_path in argv[1:]:
+            result = compare_workbook_loading(file_path)
+            print(
+                f"{result['file']}: {result['sheets']} 个表, "
+                f"逐表读取 {result['per_sheet_seconds']:.3f}s, "
+                f"单次打开 {result['session_seconds']:.3f}s, "
+                f"节省 {result['saved_seconds']:.3f}s"
+            )
 
 
 if __name__ == "__main__":
+    # Required for the process pool in a PyInstaller build
+    multiprocessing.freeze_support()
+
+    if len(sys.argv) > 1 and sys.argv[1].startswith("--bench"):
+        run_benchmarks(sys.argv[1:])
+        sys.exit(0)
+
     # Add exception handling
     try:
         app = ModernExcelSearchApp()
+        # --startup-time: log the startup time and quit once the search is ready
+        app.report_startup = "--startup-time" in sys.argv[1:]
         app.mainloop()
     except Exception as e:
         messagebox.showerror("严重错误", f"程序崩溃: {str(e)}")
\ No newline at end of file
@@ -1,3 +1,9 @@
-from PyInstaller.utils.hooks import collect_data_files
+from PyInstaller.utils.hooks import collect_submodules
 
-datas = collect_data_files('pandas')
\ No newline at end of file
+# pandas' compiled modules import each other by name
+hiddenimports = collect_submodules('pandas._libs')
+
+# No pandas data files: the Styler templates are only read through jinja2, which
+# the build excludes since this program never styles a DataFrame, and the test
+# suite and its fixtures were most of what collect_data_files('pandas') bundled
+datas = []
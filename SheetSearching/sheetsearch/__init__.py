@@ -0,0 +1,94 @@
+"""
+Excel multi-sheet search without the GUI.
+
+The names listed in __all__ are the stable API; import them from here rather
+than from the submodules, which may be reorganized:
+
+    from sheetsearch import search_excel_files, iter_results
+    results = search_excel_files(paths, "张三")
+    for file_path, sheet_name, hits in iter_results(results):
+        print(file_path, sheet_name, hits.addresses())
+
+iter_search() takes the same arguments and yields ("sheet", file_path,
+sheet_name, hits), ("error", file_path, message) and ("file", file_path,
+file_stats) events as the search goes; closing it stops the search.
+
+Names are loaded from their submodule on first use, so importing the package
+is cheap, and pandas is only imported once something that needs it is used.
+The mode tables, defaults and caches (SEARCH_MODES, STOP_MODES,
+default_worker_count, variant_folding_available, SheetCache, DiskSheetCache)
+never import pandas; preload() imports everything else ahead of time, e.g.
+in a background thread while a window is already shown.
+The command line is in sheetsearch.cli (python -m sheetsearch PATH... -q TERM).
+No GUI toolkit is imported anywhere in the package.
+"""
+import importlib
+
+_API = {
+    # Searching
+    'search_excel_files': 'search',
+    'iter_search': 'search',
+    'search_single_file': 'search',
+    'read_workbook_sheets': 'search',
+    'default_worker_count': 'options',
+    'STOP_MODES': 'options',
+    # Matching
+    'make_matcher': 'matchers',
+    'SEARCH_MODES': 'options',
+    'MatchTimeout': 'matchers',
+    'parse_query': 'matchers',
+    'split_terms': 'matchers',
+    'load_term_list': 'matchers',
+    'benchmark_row_matchers': 'matchers',
+    'benchmark_fuzzy_matcher': 'matchers',
+    'normalize_text': 'columns',
+    'variant_folding_available': 'options',
+    'column_letter': 'columns',
+    # Results
+    'SheetHits': 'results',
+    'iter_results': 'results',
+    'failed_files': 'results',
+    'hit_row_count': 'results',
+    # Engines
+    'get_available_engines': 'engines',
+    'sniff_excel_format': 'engines',
+    'route_engines': 'engines',
+    'WorkbookSession': 'engines',
+    'iter_workbook_rows': 'engines',
+    'compare_workbook_loading': 'engines',
+    'SCAN_ENGINES': 'scanners',
+    'scan_workbook_streaming': 'scanners',
+    'scan_xlsx_zip': 'scanners',
+    # Repair
+    'read_problematic_excel': 'repair',
+    'repair_excel_with_com': 'repair',
+    # Caches and index
+    'SheetCache': 'cache',
+    'DiskSheetCache': 'cache',
+    'SheetIndex': 'index',
+    # Files
+    'collect_excel_files': 'files',
+    'iter_excel_files': 'files',
+    'EXCEL_EXTENSIONS': 'files',
+    'file_fingerprint': 'files',
+    'get_app_data_dir': 'files',
+}
+
+__all__ = sorted(list(_API) + ['preload'])
+
+def __getattr__(name):
+    module_name = _API.get(name)
+    if module_name is None:
+        raise AttributeError(f"module 'sheetsearch' has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"sheetsearch.{module_name}"), name)
+    # Later lookups skip __getattr__
+    globals()[name] = value
+    return value
+
+def preload():
+    """Import every submodule now, so the first search does not wait for pandas"""
+    for module_name in sorted(set(_API.values())):
+        importlib.import_module(f"sheetsearch.{module_name}")
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
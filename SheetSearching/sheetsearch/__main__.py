@@ -0,0 +1,9 @@
+import sys
+import multiprocessing
+
+from sheetsearch.cli import main
+
+if __name__ == "__main__":
+    # Required for the process pool in a PyInstaller build
+    multiprocessing.freeze_support()
+    sys.exit(main())
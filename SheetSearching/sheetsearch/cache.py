@@ -0,0 +1,345 @@
+"""
+In-memory and on-disk caches of parsed workbooks. pandas is only imported
+when a cache file is written or read, so a cache can be set up at startup.
+"""
+import os
+import glob
+from collections import OrderedDict
+import json
+import hashlib
+import struct
+import zlib
+import threading
+
+from sheetsearch.files import get_app_data_dir
+
+DISK_CACHE_MAGIC = b'SSSC\x01'
+
+def write_sheets_file(path, sheets):
+    """
+    Store parsed text sheets in a compact columnar file: a magic header, a JSON
+    table of contents, then one zlib block per column holding the cells joined
+    by NUL. Loading is a decompress plus str.split per column, with no per-cell
+    Python work. Returns False if a cell contains NUL (it could not be split back).
+    """
+    import pandas as pd
+    import numpy as np
+
+    toc = {'sheets': []}
+    blocks = []
+    offset = 0
+    for sheet_name, df in sheets.items():
+        columns = []
+        for column in df.columns:
+            values = df[column].astype(str).tolist()
+            text = "\x00".join(values)
+            if text.count("\x00") != max(len(values) - 1, 0):
+                return False
+            block = zlib.compress(text.encode('utf-8'), 1)
+            columns.append([column.item() if isinstance(column, np.integer) else column, offset, len(block)])
+            blocks.append(block)
+            offset += len(block)
+
+        index = df.index
+        default_index = isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1
+        toc['sheets'].append({
+            'name': sheet_name,
+            'rows': len(df),
+            'index': None if default_index else [int(label) for label in index],
+            'columns': columns
+        })
+
+    header = json.dumps(toc, ensure_ascii=False).encode('utf-8')
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as handle:
+        handle.write(DISK_CACHE_MAGIC)
+        handle.write(struct.pack('<I', len(header)))
+        handle.write(header)
+        for block in blocks:
+            handle.write(block)
+    os.replace(tmp_path, path)
+    return True
+
+def read_sheets_file(path):
+    """Load {sheet_name: df} written by write_sheets_file"""
+    import pandas as pd
+
+    with open(path, 'rb') as handle:
+        data = handle.read()
+    if not data.startswith(DISK_CACHE_MAGIC):
+        raise ValueError("缓存文件格式不正确")
+    header_length = struct.unpack_from('<I', data, len(DISK_CACHE_MAGIC))[0]
+    body_start = len(DISK_CACHE_MAGIC) + 4 + header_length
+    toc = json.loads(data[len(DISK_CACHE_MAGIC) + 4:body_start].decode('utf-8'))
+
+    sheets = {}
+    for sheet in toc['sheets']:
+        columns = {}
+        for label, offset, length in sheet['columns']:
+            start = body_start + offset
+            text = zlib.decompress(data[start:start + length]).decode('utf-8')
+            columns[label] = text.split("\x00") if sheet['rows'] else []
+        index = sheet['index'] if sheet['index'] is not None else pd.RangeIndex(sheet['rows'])
+        sheets[sheet['name']] = pd.DataFrame(columns, index=index, dtype=str)
+    return sheets
+
+class DiskSheetCache:
+    """
+    Persistent cache of parsed workbooks in the app data dir, one columnar file
+    per workbook version (path hash + fingerprint hash). Total size is capped;
+    the least recently used files (by mtime, touched on every hit) go first.
+    """
+
+    SUFFIX = '.sssc'
+
+    def __init__(self, cache_dir=None, max_mb=2048):
+        self.cache_dir = cache_dir or os.path.join(get_app_data_dir(), 'sheet_cache')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        # Running total of the entry sizes, counted from the directory on first put
+        self.total_bytes = None
+
+    def _entry_path(self, file_path):
+        stat = os.stat(file_path)
+        path_hash = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:20]
+        version_hash = hashlib.sha1(f"{stat.st_mtime}|{stat.st_size}".encode()).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"{path_hash}-{version_hash}{self.SUFFIX}")
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.cache_dir) as scan:
+            for entry in scan:
+                if entry.name.endswith(self.SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def get(self, file_path):
+        try:
+            entry_path = self._entry_path(file_path)
+        except OSError:
+            return None
+        try:
+            sheets = read_sheets_file(entry_path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError, IndexError, struct.error, zlib.error):
+            # A truncated or corrupt entry (ValueError covers JSON and UTF-8
+            # errors) is a miss; drop it so it is written again
+            try:
+                os.unlink(entry_path)
+                # Recounted from the directory on the next put
+                self.total_bytes = None
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return sheets
+
+    def put(self, file_path, sheets):
+        try:
+            entry_path = self._entry_path(file_path)
+            if self.total_bytes is None:
+                self.total_bytes = self.size_bytes()
+            # Drop cached versions of the same file (same path hash) that are now stale,
+            # and the entry being rewritten
+            path_hash = os.path.basename(entry_path).split('-')[0]
+            for path in glob.glob(os.path.join(glob.escape(self.cache_dir), f"{path_hash}-*{self.SUFFIX}")):
+                size = os.path.getsize(path)
+                os.unlink(path)
+                self.total_bytes -= size
+            if write_sheets_file(entry_path, sheets):
+                self.total_bytes += os.path.getsize(entry_path)
+                if self.total_bytes > self.max_bytes:
+                    self._evict()
+        except OSError:
+            pass
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+        self.total_bytes = total
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def clear(self):
+        for _, _, path in self._entries():
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        self.total_bytes = None
+
+class SheetCache:
+    """
+    Session-level cache of parsed workbooks ({sheet_name: df}) keyed by path and
+    fingerprint (mtime, size), with LRU eviction under a memory budget in MB.
+    Repeated queries over the same files only pay for matching.
+    An optional DiskSheetCache backs it, so parsed sheets survive a restart.
+    """
+
+    # Parsed text sheets take roughly this many times the .xlsx size in memory
+    PARSED_SIZE_FACTOR = 10
+    # A one-off search is faster on the streaming engines than a full parse, so
+    # a workbook is only parsed for the cache once it has missed this often
+    FILL_AFTER_MISSES = 2
+    MISS_HISTORY = 10000
+
+    def __init__(self, max_mb=512, disk_cache=None):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.disk_cache = disk_cache
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # {key: misses} for workbooks not cached yet, newest last
+        self.miss_counts = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(file_path):
+        stat = os.stat(file_path)
+        return (os.path.abspath(file_path), stat.st_mtime, stat.st_size)
+
+    @staticmethod
+    def _sheets_size(sheets):
+        # Matching derives normalized and typed columns per sheet; they live as
+        # long as the cached DataFrame, so they count against the budget too
+        from sheetsearch.columns import derived_size
+
+        return int(sum(df.memory_usage(index=True, deep=True).sum() + derived_size(df) for df in sheets.values()))
+
+    def fits(self, file_path):
+        """
+        Whether a workbook is worth parsing in full to cache it: its estimated
+        parsed size fits the memory budget (the disk cache's with the memory
+        layer turned off). Larger files are better searched by streaming.
+        """
+        try:
+            estimate = os.path.getsize(file_path) * self.PARSED_SIZE_FACTOR
+        except OSError:
+            return False
+        budget = self.max_bytes
+        if not budget and self.disk_cache is not None:
+            budget = self.disk_cache.max_bytes
+        return estimate <= budget
+
+    def wants(self, file_path):
+        """Whether a search should parse this workbook in full now: it fits and is in repeat use"""
+        try:
+            key = self._key(file_path)
+        except OSError:
+            return False
+        with self.lock:
+            repeated = self.miss_counts.get(key, 0) >= self.FILL_AFTER_MISSES
+        return repeated and self.fits(file_path)
+
+    def get(self, file_path):
+        try:
+            key = self._key(file_path)
+        except OSError:
+            return None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        sheets = self.disk_cache.get(file_path) if self.disk_cache is not None else None
+        with self.lock:
+            if sheets is None:
+                self.misses += 1
+                self.miss_counts[key] = self.miss_counts.pop(key, 0) + 1
+                while len(self.miss_counts) > self.MISS_HISTORY:
+                    self.miss_counts.popitem(last=False)
+                return None
+            self.disk_hits += 1
+        self._remember(key, sheets)
+        return sheets
+
+    def put(self, file_path, sheets):
+        try:
+            key = self._key(file_path)
+        except OSError:
+            return
+        if self.disk_cache is not None:
+            self.disk_cache.put(file_path, sheets)
+        self._remember(key, sheets)
+
+    def remeasure(self, file_path):
+        """
+        Count a cached workbook again after a search, with the derived columns
+        built for it since it was stored; evicting it drops them as well.
+        """
+        try:
+            key = self._key(file_path)
+        except OSError:
+            return
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            return
+        size = self._sheets_size(entry[0])
+        with self.lock:
+            if self.entries.get(key) is not entry:
+                return
+            self.current_bytes += size - entry[1]
+            if size > self.max_bytes:
+                del self.entries[key]
+                self.current_bytes -= size
+                return
+            self.entries[key] = (entry[0], size)
+            self._evict()
+
+    def _remember(self, key, sheets):
+        size = self._sheets_size(sheets)
+        with self.lock:
+            self.miss_counts.pop(key, None)
+            if key in self.entries:
+                self.current_bytes -= self.entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            # Older versions of the same file can never be hit again
+            for stale in [stale for stale in self.entries if stale[0] == key[0]]:
+                self.current_bytes -= self.entries.pop(stale)[1]
+            self.entries[key] = (sheets, size)
+            self.current_bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self.entries:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.current_bytes -= size
+
+    def resize(self, max_mb):
+        with self.lock:
+            self.max_bytes = int(max_mb * 1024 * 1024)
+            self._evict()
+
+    def clear(self, disk=False):
+        with self.lock:
+            self.entries.clear()
+            self.miss_counts.clear()
+            self.current_bytes = 0
+        if disk and self.disk_cache is not None:
+            self.disk_cache.clear()
+
+    def summary(self):
+        summary = f"缓存: 命中 {self.hits} / 未命中 {self.misses} · {self.current_bytes / 1024 / 1024:.1f} MB"
+        if self.disk_cache is not None:
+            summary += f" · 磁盘命中 {self.disk_hits}"
+        return summary
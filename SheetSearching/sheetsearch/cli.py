@@ -0,0 +1,197 @@
+"""
+Command line search: python -m sheetsearch PATH... -q TERM
+
+Results are written to stdout as each sheet is matched, one JSON object per
+matching row (or per sheet with --stop count), or as CSV. Errors go to the
+JSON stream as {"file", "error"} records, or to stderr for CSV.
+Exit status: 0 matches found, 1 no matches, 2 bad arguments or query,
+3 at least one file could not be searched, 130 interrupted.
+Nothing heavy is imported until the arguments are parsed, and no GUI
+toolkit is imported at all.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+from sheetsearch.options import SEARCH_MODES, STOP_MODES
+
+EXIT_FOUND = 0
+EXIT_NOT_FOUND = 1
+EXIT_USAGE = 2
+EXIT_FILE_ERRORS = 3
+EXIT_INTERRUPTED = 130
+
+ROW_BLOCK = 1000
+
+MODES = list(SEARCH_MODES.values())
+STOPS = [stop for stop in STOP_MODES.values() if stop is not None]
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="sheetsearch",
+        description="在Excel文件的所有工作表中搜索，每个工作表匹配完即输出到标准输出"
+    )
+    parser.add_argument("paths", nargs="+", metavar="PATH", help="Excel文件或文件夹（包括子文件夹）")
+    parser.add_argument("-q", "--query", help="搜索内容")
+    parser.add_argument("-t", "--terms-file", help="从词表文件读取多个搜索词（多词模式）")
+    parser.add_argument("-m", "--mode", choices=MODES, default="literal", help="匹配方式（默认 literal）")
+    parser.add_argument("-c", "--case-sensitive", action="store_true", help="区分大小写")
+    parser.add_argument("--fold-variants", action="store_true", help="繁简通用（需要 opencc）")
+    parser.add_argument("-d", "--max-distance", type=int, default=1, help="模糊匹配的最大编辑距离（默认 1）")
+    parser.add_argument("--stop", choices=STOPS, help="提前结束: first=前N行, exists=每个文件首个命中, count=仅计数")
+    parser.add_argument("-n", "--max-hits", type=int, default=100, help="--stop first 的行数（默认 100）")
+    parser.add_argument("-f", "--format", choices=["jsonl", "csv"], default="jsonl", help="输出格式（默认 jsonl）")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="并行进程数（默认 1）")
+    parser.add_argument("--index", nargs="?", const="", metavar="DB", help="使用全文索引（可指定数据库路径）")
+    parser.add_argument("--no-values", action="store_true", help="只输出命中单元格地址，不读取行内容")
+    parser.add_argument("--include", help="文件夹中只搜索匹配的文件，如 \"*2024*;报表/*\"")
+    parser.add_argument("--exclude", help="跳过匹配的文件和子文件夹，如 \"备份;*旧*\"")
+    parser.add_argument("--max-depth", type=int, help="子文件夹层数（0 只搜索文件夹本身）")
+    parser.add_argument("--min-size", type=float, metavar="MB", help="跳过小于此大小的文件")
+    parser.add_argument("--max-size", type=float, metavar="MB", help="跳过大于此大小的文件")
+    return parser
+
+class ResultWriter:
+    """Writes search results in the chosen format as they arrive"""
+
+    def __init__(self, stream, output_format, with_values=True):
+        self.stream = stream
+        self.output_format = output_format
+        self.with_values = with_values
+        self.csv_writer = csv.writer(stream) if output_format == "csv" else None
+        self.matched_files = set()
+        self.rows = 0
+        self.errors = 0
+
+    def _emit(self, record, csv_row):
+        if self.csv_writer is not None:
+            self.csv_writer.writerow(csv_row)
+        else:
+            self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def error(self, file_path, message):
+        self.errors += 1
+        if self.csv_writer is not None:
+            print(f"{file_path}: {message}", file=sys.stderr)
+        else:
+            self._emit({"file": file_path, "error": message}, None)
+        self.stream.flush()
+
+    def sheet(self, file_path, sheet_name, sheet_hits, count_only):
+        self.matched_files.add(file_path)
+        self.rows += len(sheet_hits)
+        if count_only:
+            self._emit({"file": file_path, "sheet": sheet_name, "count": len(sheet_hits)},
+                       [file_path, sheet_name, len(sheet_hits)])
+        else:
+            self._sheet_rows(file_path, sheet_name, sheet_hits)
+        self.stream.flush()
+
+    def _sheet_rows(self, file_path, sheet_name, sheet_hits):
+        from sheetsearch import column_letter
+
+        tag_names = list(sheet_hits.tags)
+        for start in range(0, len(sheet_hits), ROW_BLOCK):
+            stop = min(start + ROW_BLOCK, len(sheet_hits))
+            block = sheet_hits.load_rows(start, stop) if self.with_values else None
+            for offset, row in enumerate(sheet_hits.rows[start:stop].tolist()):
+                cells = [f"{column_letter(col)}{row + 1}" for col in sheet_hits.row_hit_columns(row)]
+                tags = {name: values[start + offset] for name, values in sheet_hits.tags.items()}
+                values = block.iloc[offset, len(tag_names):].tolist() if block is not None else []
+                record = {"file": file_path, "sheet": sheet_name, "row": row + 1, "cells": cells}
+                if tags:
+                    record["tags"] = tags
+                if block is not None:
+                    record["values"] = values
+                self._emit(record, [file_path, sheet_name, row + 1, " ".join(cells)]
+                           + [tags[name] for name in tag_names] + values)
+
+def expand_paths(paths, **scan_options):
+    """Files as given, folders expanded to the Excel files under them (see iter_excel_files)"""
+    from sheetsearch import iter_excel_files
+
+    file_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            file_paths.extend(iter_excel_files(path, **scan_options))
+        elif os.path.isfile(path):
+            file_paths.append(path)
+        else:
+            raise FileNotFoundError(f"找不到文件或文件夹: {path}")
+    return file_paths
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.query is None and args.terms_file is None:
+        print("sheetsearch: 需要 -q 搜索内容或 -t 词表文件", file=sys.stderr)
+        return EXIT_USAGE
+
+    # Cell texts are mostly Chinese; do not depend on the console code page
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(encoding="utf-8")
+
+    from sheetsearch import SheetIndex, iter_search, load_term_list, make_matcher
+
+    try:
+        file_paths = expand_paths(
+            args.paths,
+            include=args.include,
+            exclude=args.exclude,
+            max_depth=args.max_depth,
+            min_size=None if args.min_size is None else int(args.min_size * 1024 * 1024),
+            max_size=None if args.max_size is None else int(args.max_size * 1024 * 1024)
+        )
+        search_term = args.query
+        mode = args.mode
+        if args.terms_file is not None:
+            search_term = load_term_list(args.terms_file) + ([args.query] if args.query else [])
+            mode = "multi"
+        # Validate the query before any file is opened
+        make_matcher(search_term, args.case_sensitive, mode, args.max_distance, args.fold_variants)
+    except (ValueError, OSError) as e:
+        print(f"sheetsearch: {str(e)}", file=sys.stderr)
+        return EXIT_USAGE
+
+    writer = ResultWriter(sys.stdout, args.format, with_values=not args.no_values)
+    index = None
+    events = None
+    try:
+        if args.index is not None:
+            index = SheetIndex(args.index or None)
+        events = iter_search(
+            file_paths,
+            search_term,
+            args.case_sensitive,
+            workers=args.workers,
+            index=index,
+            mode=mode,
+            max_distance=args.max_distance,
+            fold_variants=args.fold_variants,
+            stop=args.stop,
+            max_hits=args.max_hits
+        )
+        for event in events:
+            if event[0] == "sheet":
+                writer.sheet(*event[1:], args.stop == "count")
+            elif event[0] == "error":
+                writer.error(*event[1:])
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into head); that is not an error
+        sys.stdout = open(os.devnull, "w")
+        return EXIT_FOUND
+    finally:
+        # Stops the work still running, e.g. after the reader went away
+        if events is not None:
+            events.close()
+        if index is not None:
+            index.close()
+
+    print(f"{len(file_paths)} 个文件, {len(writer.matched_files)} 个文件匹配, 共 {writer.rows} 行"
+          + (f", {writer.errors} 个文件出错" if writer.errors else ""), file=sys.stderr)
+    if writer.errors:
+        return EXIT_FILE_ERRORS
+    return EXIT_FOUND if writer.rows else EXIT_NOT_FOUND
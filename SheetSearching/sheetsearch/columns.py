@@ -0,0 +1,292 @@
+"""
+Text normalization, column addressing, and the columns derived once per sheet
+(normalized text, typed numbers and dates) that the matchers share.
+"""
+import pandas as pd
+import numpy as np
+import unicodedata
+import weakref
+import sys
+import re
+
+# Characters that can appear in str() of a number, date or time cell
+NUMERIC_TEXT_CHARS = set("0123456789.-+e: ")
+
+_variant_converter = None
+
+def _fold_variants(text):
+    global _variant_converter
+    if _variant_converter is None:
+        import opencc
+        try:
+            _variant_converter = opencc.OpenCC('t2s')
+        except Exception:
+            _variant_converter = opencc.OpenCC('t2s.json')
+    return _variant_converter.convert(text)
+
+def normalize_text(text, case_sensitive=False, fold_variants=False):
+    """
+    Fold text for insensitive matching: NFKC (full-width to half-width and
+    other compatibility forms), case folding unless case_sensitive, and
+    traditional to simplified Chinese if fold_variants (requires opencc).
+    """
+    text = unicodedata.normalize('NFKC', text)
+    if not case_sensitive:
+        text = text.casefold()
+    if fold_variants:
+        text = _fold_variants(text)
+    return text
+
+class NormalizedColumn:
+    """
+    The normalized cells of one column, joined by NUL into a single string
+    with the end offset of each cell. Substring search is a str.find loop over
+    that one string, mapped back to rows with searchsorted.
+    """
+
+    def __init__(self, values, case_sensitive=False, fold_variants=False):
+        cells = [value if isinstance(value, str) else str(value) for value in values]
+        text = normalize_text("\x00".join(cells), case_sensitive, fold_variants) if cells else ""
+        parts = text.split("\x00") if cells else []
+        if len(parts) != len(cells):
+            # A cell held a NUL itself; normalize cell by cell and blank it out
+            parts = [normalize_text(cell, case_sensitive, fold_variants).replace("\x00", " ") for cell in cells]
+            text = "\x00".join(parts)
+        self.text = text
+        self.lengths = np.fromiter(map(len, parts), dtype=np.int64, count=len(parts))
+        self.ends = np.cumsum(self.lengths + 1)
+
+    def __len__(self):
+        return len(self.ends)
+
+    @property
+    def nbytes(self):
+        return sys.getsizeof(self.text) + self.lengths.nbytes + self.ends.nbytes
+
+    def cell(self, row):
+        return self.text[self.ends[row] - self.lengths[row] - 1:self.ends[row] - 1]
+
+    def cells(self):
+        return self.text.split("\x00") if len(self.ends) else []
+
+    def rows_at(self, positions):
+        """Rows holding the given character offsets of text"""
+        return np.searchsorted(self.ends, positions, side='right')
+
+    def rows_containing(self, needle):
+        positions = []
+        find = self.text.find
+        position = find(needle)
+        while position != -1:
+            positions.append(position)
+            position = find(needle, position + 1)
+        return np.unique(self.rows_at(np.array(positions, dtype=np.int64)))
+
+# Derived column data (normalized text, typed values) is built once per
+# DataFrame and dropped with it, so sheets kept in the SheetCache only pay for
+# it on the first query. {id(df): {key: [column, ...]}}
+_derived_frames = {}
+
+def _derived_columns(df, key, build):
+    derived = _derived_frames.get(id(df))
+    if derived is None:
+        derived = _derived_frames[id(df)] = {}
+        weakref.finalize(df, _derived_frames.pop, id(df), None)
+    columns = derived.get(key)
+    if columns is None:
+        columns = derived[key] = [build(df[column]) for column in df.columns]
+    return columns
+
+def derived_size(df):
+    """Bytes held by the derived columns built so far for df"""
+    return sum(column.nbytes for columns in list(_derived_frames.get(id(df), {}).values()) for column in columns)
+
+def normalized_columns(df, case_sensitive=False, fold_variants=False):
+    """[NormalizedColumn, ...] for the columns of df, cached for the lifetime of df"""
+    return _derived_columns(
+        df, ('normalized', case_sensitive, fold_variants),
+        lambda values: NormalizedColumn(values.tolist(), case_sensitive, fold_variants)
+    )
+
+# Rows from which a range lookup uses a sorted column index instead of a full comparison
+SORTED_INDEX_MIN_ROWS = 50000
+
+EXCEL_EPOCH = np.datetime64('1899-12-30')
+
+class TypedColumn:
+    """
+    Native values of one text column: float64 numbers (NaN elsewhere) and
+    datetime64 timestamps (NaT elsewhere). The text renders numbers with repr
+    and datetimes in ISO form, so both convert back without loss. Sorted
+    orders for binary-search range lookups are built on first use.
+    """
+
+    def __init__(self, values):
+        if not pd.api.types.is_string_dtype(values):
+            values = values.astype(str)
+        values = values.reset_index(drop=True)
+        self.numbers = pd.to_numeric(values.str.replace(",", "", regex=False), errors='coerce').to_numpy(dtype='float64')
+        self.dates = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[ns]')
+        looks_like_date = values.str.match(r'\d{4}[-/]\d{1,2}[-/]\d{1,2}').to_numpy(dtype=bool)
+        if looks_like_date.any():
+            texts = values[looks_like_date].str.replace("/", "-", regex=False)
+            self.dates[looks_like_date] = pd.to_datetime(texts, format='ISO8601', errors='coerce').to_numpy(dtype='datetime64[ns]')
+        self._sorted = {}
+
+    @property
+    def nbytes(self):
+        # Sorted copies are built by range lookups and kept with the column
+        sorted_bytes = sum(values.nbytes + order.nbytes for values, order in list(self._sorted.values()))
+        return self.numbers.nbytes + self.dates.nbytes + sorted_bytes
+
+    def values_for(self, kind, serial_dates=False):
+        """Values to compare for a 'number' or 'date' range; optionally date serials"""
+        if kind == 'number':
+            return self.numbers
+        if serial_dates and np.isnat(self.dates).all():
+            serial = np.where((self.numbers >= 1) & (self.numbers < 2958466), self.numbers, np.nan)
+            days = (serial * 86400 * 1e9)
+            valid = ~np.isnan(days)
+            dates = np.full(len(days), np.datetime64('NaT'), dtype='datetime64[ns]')
+            dates[valid] = EXCEL_EPOCH + days[valid].astype('timedelta64[ns]')
+            return dates
+        return self.dates
+
+    def rows_in_range(self, value_range, serial_dates=False):
+        """Row positions inside value_range, by binary search over a sorted copy"""
+        key = (value_range.kind, serial_dates)
+        if key not in self._sorted:
+            values = self.values_for(value_range.kind, serial_dates)
+            valid = np.flatnonzero(~(np.isnan(values) if value_range.kind == 'number' else np.isnat(values)))
+            order = valid[np.argsort(values[valid], kind='stable')]
+            self._sorted[key] = (values[order], order)
+        sorted_values, order = self._sorted[key]
+        start = 0
+        stop = len(sorted_values)
+        if value_range.low is not None:
+            start = np.searchsorted(sorted_values, value_range.low, side='left' if value_range.include_low else 'right')
+        if value_range.high is not None:
+            stop = np.searchsorted(sorted_values, value_range.high, side='right' if value_range.include_high else 'left')
+        return order[start:max(start, stop)]
+
+def typed_columns(df):
+    """[TypedColumn, ...] for the columns of df, cached for the lifetime of df"""
+    return _derived_columns(df, ('typed',), TypedColumn)
+
+DATE_TEXT = re.compile(r'(\d{4})[-/](\d{1,2})(?:[-/](\d{1,2})(?:[ T](\d{1,2}):(\d{2})(?::(\d{2}))?)?)?$')
+
+NUMBER_TEXT = re.compile(r'[-+]?(\d[\d,]*\.?\d*|\.\d+)([eE][-+]?\d+)?$')
+
+def _parse_date_period(text):
+    """'2025-03' -> (2025-03-01, 2025-04-01): the start and exclusive end of the period"""
+    match = DATE_TEXT.match(text)
+    if not match:
+        return None
+    year, month, day, hour, minute, second = match.groups()
+    try:
+        start = pd.Timestamp(int(year), int(month), int(day or 1), int(hour or 0), int(minute or 0), int(second or 0))
+    except ValueError:
+        return None
+    if day is None:
+        end = start + pd.DateOffset(months=1)
+    elif hour is None:
+        end = start + pd.Timedelta(days=1)
+    elif second is None:
+        end = start + pd.Timedelta(minutes=1)
+    else:
+        end = start + pd.Timedelta(seconds=1)
+    return start.to_datetime64(), end.to_datetime64()
+
+class ValueRange:
+    """
+    A numeric or date range from the query syntax: a..b, ..b, a.., >a, >=a, <a,
+    <=a or =a. Partial dates cover their whole period, so 2025-03..2025-05 runs
+    from 1 March to the end of May.
+    """
+
+    def __init__(self, kind, low=None, high=None, include_low=True, include_high=True):
+        self.kind = kind
+        self.low = low
+        self.high = high
+        self.include_low = include_low
+        self.include_high = include_high
+
+    @classmethod
+    def parse(cls, text):
+        """ValueRange for text, or None if it is not range syntax"""
+        text = text.strip()
+        match = re.match(r'(>=|<=|>|<|=)(.+)$', text)
+        if match:
+            operator, bound = match.groups()
+            lower, upper = (bound, None) if operator in ('>', '>=', '=') else (None, bound)
+            if operator == '=':
+                upper = bound
+        elif '..' in text:
+            lower, upper = text.split('..', 1)
+            lower, upper = lower.strip() or None, upper.strip() or None
+            if lower is None and upper is None:
+                return None
+            operator = '..'
+        else:
+            return None
+
+        bounds = [bound.strip() for bound in (lower, upper) if bound is not None]
+        if all(NUMBER_TEXT.match(bound) for bound in bounds):
+            low = float(lower.replace(",", "")) if lower is not None else None
+            high = float(upper.replace(",", "")) if upper is not None else None
+            return cls('number', low, high, operator != '>', operator != '<')
+
+        if all(_parse_date_period(bound) for bound in bounds):
+            low = high = None
+            include_high = False
+            if lower is not None:
+                start, end = _parse_date_period(lower.strip())
+                low = end if operator == '>' else start
+            if upper is not None:
+                start, end = _parse_date_period(upper.strip())
+                high = start if operator == '<' else end
+            return cls('date', low, high, True, include_high)
+        return None
+
+    def contains(self, values):
+        """Vectorized membership for an array of numbers or datetime64 values"""
+        result = ~(np.isnan(values) if self.kind == 'number' else np.isnat(values))
+        if self.low is not None:
+            result &= (values >= self.low) if self.include_low else (values > self.low)
+        if self.high is not None:
+            result &= (values <= self.high) if self.include_high else (values < self.high)
+        return result
+
+    def match_text(self, text):
+        """Whether a single cell's text holds a value in range"""
+        text = text.strip()
+        if self.kind == 'number':
+            if not NUMBER_TEXT.match(text):
+                return False
+            values = np.array([float(text.replace(",", ""))])
+        else:
+            if not re.match(r'\d{4}[-/]\d{1,2}[-/]\d{1,2}', text):
+                return False
+            value = pd.to_datetime(text.replace("/", "-"), format='ISO8601', errors='coerce')
+            if pd.isna(value):
+                return False
+            values = np.array([value.to_datetime64()], dtype='datetime64[ns]')
+        return bool(self.contains(values)[0])
+
+def _column_index(cell_ref):
+    """'AB12' -> 27 (0-based column)"""
+    index = 0
+    for char in cell_ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + (ord(char.upper()) - 64)
+    return index - 1
+
+def column_letter(index):
+    """27 -> 'AB' (0-based column to Excel letters)"""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
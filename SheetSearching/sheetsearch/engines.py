@@ -0,0 +1,324 @@
+"""
+Reading engines: availability, format sniffing, engine routing and WorkbookSession.
+pandas and the engine packages are only imported when a workbook is opened.
+"""
+import os
+from pathlib import Path
+import importlib.util
+import time
+import json
+import zipfile
+
+from sheetsearch.files import get_app_data_dir
+
+def is_package_installed(package_name):
+    """Check if a package is installed"""
+    return importlib.util.find_spec(package_name) is not None
+
+def get_available_engines():
+    """Return a list of available Excel engines based on installed packages"""
+    engines = []
+
+    # Direct zip/XML scan first: skips .xlsx files whose shared strings cannot match
+    engines.append({'engine': 'xlsx-zip', 'options': {}})
+
+    # Streaming scan next: it keeps only matching rows in memory
+    engines.append({'engine': 'openpyxl-stream', 'options': {}})
+
+    # Always include default engine
+    engines.append({'engine': 'openpyxl', 'options': {}})
+    engines.append({'engine': 'openpyxl', 'options': {'read_only': True, 'data_only': True}})
+
+    # Check for other engines
+    if is_package_installed('xlrd'):
+        engines.append({'engine': 'xlrd', 'options': {}})
+
+    if is_package_installed('pyxlsb'):
+        engines.append({'engine': 'pyxlsb', 'options': {}})
+
+    if is_package_installed('odf'):
+        engines.append({'engine': 'odf', 'options': {}})
+
+    return engines
+
+def engine_key(engine_config):
+    """Stable name for an engine configuration, e.g. 'openpyxl:data_only:read_only'"""
+    return ":".join([engine_config['engine']] + sorted(engine_config['options']))
+
+# Engines worth trying for each sniffed container format, best first
+FORMAT_ENGINES = {
+    'xlsx': ['xlsx-zip', 'openpyxl-stream', 'openpyxl'],
+    'xlsm': ['xlsx-zip', 'openpyxl-stream', 'openpyxl'],
+    'xls': ['xlrd'],
+    'xlsb': ['pyxlsb'],
+    'ods': ['odf']
+}
+
+OLE2_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+ZIP_MAGIC = b'PK\x03\x04'
+
+def sniff_excel_format(file_path):
+    """
+    Identify the real container format from magic bytes rather than the
+    extension: OLE2 -> 'xls'; ZIP -> 'xlsx', 'xlsm', 'xlsb' or 'ods' from its
+    content types / mimetype. Anything else is 'unknown'.
+    """
+    with open(file_path, 'rb') as handle:
+        magic = handle.read(8)
+
+    if magic == OLE2_MAGIC:
+        return 'xls'
+    if not magic.startswith(ZIP_MAGIC):
+        return 'unknown'
+
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            names = set(archive.namelist())
+            if 'mimetype' in names:
+                if archive.read('mimetype').strip() == b'application/vnd.oasis.opendocument.spreadsheet':
+                    return 'ods'
+                return 'unknown'
+            if '[Content_Types].xml' not in names:
+                return 'unknown'
+            content_types = archive.read('[Content_Types].xml')
+    except zipfile.BadZipFile:
+        return 'unknown'
+
+    if b'application/vnd.ms-excel.sheet.binary.macroEnabled.main' in content_types:
+        return 'xlsb'
+    if b'application/vnd.ms-excel.sheet.macroEnabled.main+xml' in content_types:
+        return 'xlsm'
+    if b'spreadsheetml.sheet.main+xml' in content_types or b'spreadsheetml.template.main+xml' in content_types:
+        return 'xlsx'
+    return 'unknown'
+
+_ENGINE_ROUTES = None
+
+def _engine_routes_path():
+    return os.path.join(get_app_data_dir(), 'engine_routes.json')
+
+def _route_key(file_path):
+    stat = os.stat(file_path)
+    return f"{os.path.abspath(file_path)}|{stat.st_mtime}|{stat.st_size}"
+
+def load_engine_routes():
+    """{fingerprint key: engine key} of the engine that last worked per file"""
+    global _ENGINE_ROUTES
+    if _ENGINE_ROUTES is None:
+        try:
+            with open(_engine_routes_path(), 'r', encoding='utf-8') as handle:
+                _ENGINE_ROUTES = json.load(handle)
+        except (OSError, ValueError):
+            _ENGINE_ROUTES = {}
+    return _ENGINE_ROUTES
+
+def remember_engines(file_engines, max_entries=20000):
+    """Record {file_path: engine key} results and persist them"""
+    routes = load_engine_routes()
+    changed = False
+    for file_path, key in file_engines.items():
+        try:
+            route_key = _route_key(file_path)
+        except OSError:
+            continue
+        if routes.get(route_key) != key:
+            routes.pop(route_key, None)
+            routes[route_key] = key
+            changed = True
+    if not changed:
+        return
+    # Oldest entries first in the dict; keep the newest
+    for route_key in list(routes)[:max(len(routes) - max_entries, 0)]:
+        del routes[route_key]
+    try:
+        with open(_engine_routes_path(), 'w', encoding='utf-8') as handle:
+            json.dump(routes, handle, ensure_ascii=False)
+    except OSError:
+        pass
+
+def learned_engine(file_path):
+    """Engine key that last worked for this exact file version, if any"""
+    try:
+        return load_engine_routes().get(_route_key(file_path))
+    except OSError:
+        return None
+
+def route_engines(file_path, preferred_engine=None):
+    """
+    Engines to try for one file, in order: the engine that last worked for this
+    file fingerprint, then the engines that fit its sniffed format. Unknown
+    formats fall back to every available engine.
+    """
+    engines = get_available_engines()
+    try:
+        file_format = sniff_excel_format(file_path)
+    except OSError:
+        file_format = 'unknown'
+
+    if file_format in FORMAT_ENGINES:
+        wanted = FORMAT_ENGINES[file_format]
+        routed = [config for config in engines if config['engine'] in wanted]
+        routed.sort(key=lambda config: wanted.index(config['engine']))
+        if routed:
+            engines = routed
+
+    if preferred_engine is not None:
+        engines.sort(key=lambda config: engine_key(config) != preferred_engine)
+    return engines
+
+class WorkbookSession:
+    """
+    Open a workbook once and serve every sheet from the same parsed handle.
+    pd.read_excel(path, sheet_name=...) reopens the file, unzips it and re-parses
+    shared strings and styles for every sheet; a session pays that cost only once.
+    """
+
+    def __init__(self, file_path, engine=None, options=None):
+        self.file_path = file_path
+        self.engine = engine
+        self.options = options or {}
+        self.open_seconds = 0.0
+        self.parse_seconds = 0.0
+        self.sheets_served = 0
+        self._xl = None
+
+    def __enter__(self):
+        import pandas as pd
+
+        start = time.perf_counter()
+        kwargs = {'engine_kwargs': self.options} if self.options else {}
+        self._xl = pd.ExcelFile(self.file_path, engine=self.engine, **kwargs)
+        self.open_seconds = time.perf_counter() - start
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._xl is not None:
+            self._xl.close()
+            self._xl = None
+        return False
+
+    @property
+    def sheet_names(self):
+        return self._xl.sheet_names
+
+    def read_sheet(self, sheet_name):
+        """Parse one sheet from the open handle in strict text mode"""
+        start = time.perf_counter()
+        df = self._xl.parse(
+            sheet_name,
+            header=None,
+            dtype=str,
+            na_filter=False,
+            keep_default_na=False
+        )
+        # The readers return error cells as NaN even with na_filter off
+        df = df.fillna("")
+        self.parse_seconds += time.perf_counter() - start
+        self.sheets_served += 1
+        return df
+
+    def iter_sheets(self):
+        for sheet_name in self.sheet_names:
+            yield sheet_name, self.read_sheet(sheet_name)
+
+    @property
+    def saved_seconds(self):
+        """Estimated time saved: the old per-sheet read_excel reopened the file for every sheet"""
+        return self.open_seconds * max(self.sheets_served - 1, 0)
+
+    def stats(self):
+        return {
+            'engine': self.engine,
+            'sheets': self.sheets_served,
+            'open_seconds': self.open_seconds,
+            'parse_seconds': self.parse_seconds,
+            'saved_seconds': self.saved_seconds
+        }
+
+def compare_workbook_loading(file_path, engine=None):
+    """
+    Time the old per-sheet pd.read_excel loop against a single WorkbookSession
+    on the same file. Returns both timings and the saving in seconds.
+    """
+    import pandas as pd
+
+    start = time.perf_counter()
+    sheet_names = pd.ExcelFile(file_path, engine=engine).sheet_names
+    for sheet_name in sheet_names:
+        pd.read_excel(
+            file_path,
+            sheet_name=sheet_name,
+            engine=engine,
+            header=None,
+            dtype=str,
+            na_filter=False,
+            keep_default_na=False
+        )
+    per_sheet_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with WorkbookSession(file_path, engine) as session:
+        for _ in session.iter_sheets():
+            pass
+    session_seconds = time.perf_counter() - start
+
+    return {
+        'file': Path(file_path).name,
+        'sheets': len(sheet_names),
+        'per_sheet_seconds': per_sheet_seconds,
+        'session_seconds': session_seconds,
+        'saved_seconds': per_sheet_seconds - session_seconds
+    }
+
+def cell_to_text(value):
+    """
+    Render a cell value the way pd.read_excel(dtype=str) does: booleans as
+    True/False, whole floats without the .0
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def openpyxl_cell_text(cell):
+    """
+    Text of an openpyxl cell. Error cells (#N/A, #DIV/0! ...) render empty, as
+    pandas reads them as missing; their value alone looks like plain text.
+    """
+    if cell.data_type == 'e':
+        return ""
+    return cell_to_text(cell.value)
+
+def iter_workbook_rows(file_path, engine, options=None):
+    """
+    Yield (sheet_name, row_idx, values) for every non-empty row of a workbook
+    using one engine, with trailing empty cells dropped. 'openpyxl-stream'
+    streams rows; pandas engines go through a WorkbookSession.
+    """
+    def trimmed(values):
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    if engine == 'openpyxl-stream':
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+        try:
+            for worksheet in workbook.worksheets:
+                for row_idx, row in enumerate(worksheet.iter_rows()):
+                    values = trimmed([openpyxl_cell_text(cell) for cell in row])
+                    if values:
+                        yield worksheet.title, row_idx, values
+        finally:
+            workbook.close()
+        return
+
+    with WorkbookSession(file_path, engine, options) as session:
+        for sheet_name, df in session.iter_sheets():
+            for row_idx, values in zip(df.index, df.to_numpy(dtype=object).tolist()):
+                values = trimmed([str(value) for value in values])
+                if values:
+                    yield sheet_name, int(row_idx), values
@@ -0,0 +1,103 @@
+"""Workbook discovery, file fingerprints and the per-user data directory"""
+import os
+import hashlib
+from fnmatch import fnmatchcase
+
+# Workbook formats the engines can read (see engines.FORMAT_ENGINES)
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm', '.xls', '.xlsb', '.ods')
+
+def get_app_data_dir():
+    """Per-user directory for the index and caches"""
+    base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache')
+    path = os.path.join(base, 'SSSU')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def split_patterns(patterns):
+    """Glob patterns from a list or a string separated by ';' or ',', lowercased"""
+    if not patterns:
+        return []
+    if isinstance(patterns, str):
+        patterns = patterns.replace(',', ';').split(';')
+    return [pattern.strip().replace('\\', '/').lower() for pattern in patterns if pattern.strip()]
+
+def _matches(patterns, name, relative_path):
+    # A pattern with a '/' is matched against the path below the scanned folder
+    return any(fnmatchcase(relative_path if '/' in pattern else name, pattern) for pattern in patterns)
+
+def iter_excel_files(folder, include=None, exclude=None, max_depth=None, min_size=None, max_size=None,
+                     skip_lock_files=True, errors=None):
+    """
+    Walk folder with os.scandir and yield the paths of the workbooks in it
+    (EXCEL_EXTENSIONS), a folder's files before its subfolders, in name order.
+    include and exclude are glob patterns (see split_patterns), matched without
+    case against the file name, or against the path below folder if the pattern
+    contains '/'; exclude also prunes matching subfolders. max_depth 0 lists
+    folder itself only, None has no limit; min_size and max_size are in bytes.
+    Office lock files (~$name.xlsx) are skipped, and so are symlinked folders.
+    Folders that cannot be read are skipped, with a message in errors if given.
+    """
+    include = split_patterns(include)
+    exclude = split_patterns(exclude)
+    check_size = min_size is not None or max_size is not None
+    pending = [(folder, '', 0)]
+    while pending:
+        path, relative, depth = pending.pop()
+        try:
+            with os.scandir(path) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name.lower())
+        except OSError as e:
+            if errors is not None:
+                errors.append(f"{path}: {e.strerror or str(e)}")
+            continue
+
+        subfolders = []
+        for entry in entries:
+            name = entry.name.lower()
+            relative_path = relative + name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if (max_depth is None or depth < max_depth) and not _matches(exclude, name, relative_path):
+                        subfolders.append((entry.path, relative_path + '/', depth + 1))
+                    continue
+                if not name.endswith(EXCEL_EXTENSIONS) or not entry.is_file():
+                    continue
+                if skip_lock_files and name.startswith('~$'):
+                    continue
+                if include and not _matches(include, name, relative_path):
+                    continue
+                if _matches(exclude, name, relative_path):
+                    continue
+                if check_size:
+                    # Free on Windows, where scandir already has the size
+                    size = entry.stat().st_size
+                    if (min_size is not None and size < min_size) or (max_size is not None and size > max_size):
+                        continue
+            except OSError:
+                continue
+            yield entry.path
+
+        # Depth first, subfolders in name order
+        pending.extend(reversed(subfolders))
+
+def collect_excel_files(folder, **options):
+    """The workbooks under folder as a list; options as for iter_excel_files"""
+    return list(iter_excel_files(folder, **options))
+
+def file_fingerprint(file_path, with_hash=False, sample_size=1 << 16):
+    """
+    {path, mtime, size, hash} for a file. The optional hash is a fast content
+    hash over the size and three samples (head, middle, tail), enough to
+    recognise a moved or renamed workbook without reading it all.
+    """
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    fingerprint = {'path': file_path, 'mtime': stat.st_mtime, 'size': stat.st_size, 'hash': None}
+    if with_hash:
+        digest = hashlib.blake2b(str(stat.st_size).encode(), digest_size=16)
+        with open(file_path, 'rb') as handle:
+            for offset in (0, max(stat.st_size // 2 - sample_size // 2, 0), max(stat.st_size - sample_size, 0)):
+                handle.seek(offset)
+                digest.update(handle.read(sample_size))
+        fingerprint['hash'] = digest.hexdigest()
+    return fingerprint
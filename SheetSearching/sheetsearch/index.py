@@ -0,0 +1,384 @@
+"""Persistent SQLite full-text index of workbook cells"""
+import pandas as pd
+import os
+import sqlite3
+
+from sheetsearch.files import file_fingerprint, get_app_data_dir, iter_excel_files
+from sheetsearch.engines import iter_workbook_rows, learned_engine, route_engines
+from sheetsearch.columns import normalize_text
+from sheetsearch.results import frame_hits
+
+# Bound parameters stay below SQLite's old limit of 999 next to 500 file ids
+SHORT_TERMS_LIMIT = 200
+
+def default_index_path():
+    return os.path.join(get_app_data_dir(), 'sheet_index.sqlite')
+
+class SheetIndex:
+    """
+    Persistent full-text index of every cell in a set of workbooks.
+    Cells live in a plain table (file, sheet, row, column, text, and norm, the
+    text folded like the matchers fold it: NFKC and casefold). norm is indexed
+    by an FTS5 table with the trigram tokenizer, which matches any substring of
+    three or more characters and so works for Chinese text without spaces.
+    Shorter terms are filtered with instr() while scanning the cell table, and
+    SQLite builds without trigram scan it in full, which is still far cheaper
+    than parsing the workbooks.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or default_index_path()
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                hash TEXT,
+                engine TEXT
+            );
+            CREATE TABLE IF NOT EXISTS sheets (
+                id INTEGER PRIMARY KEY,
+                file_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                width INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS cells (
+                id INTEGER PRIMARY KEY,
+                sheet_id INTEGER NOT NULL,
+                row INTEGER NOT NULL,
+                col INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                norm TEXT
+            );
+            CREATE INDEX IF NOT EXISTS sheets_file ON sheets(file_id);
+            CREATE INDEX IF NOT EXISTS cells_sheet_row ON cells(sheet_id, row);
+        """)
+        # Indexes built before content hashes were stored lack the column
+        if 'hash' not in [column[1] for column in self.conn.execute("PRAGMA table_info(files)")]:
+            self.conn.execute("ALTER TABLE files ADD COLUMN hash TEXT")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_hash ON files(hash)")
+        # Indexes built before the folded text was stored get it now; their
+        # full-text table indexed the raw text and is rebuilt over norm
+        rebuild = 'norm' not in [column[1] for column in self.conn.execute("PRAGMA table_info(cells)")]
+        if rebuild:
+            self.conn.create_function('normalize_text', 1, normalize_text, deterministic=True)
+            with self.conn:
+                self.conn.execute("ALTER TABLE cells ADD COLUMN norm TEXT")
+                self.conn.execute("UPDATE cells SET norm = normalize_text(text)")
+                self.conn.execute("DROP TABLE IF EXISTS cells_fts")
+        try:
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS cells_fts USING fts5("
+                "norm, content='cells', content_rowid='id', tokenize='trigram')"
+            )
+            if rebuild:
+                with self.conn:
+                    self.conn.execute("INSERT INTO cells_fts(cells_fts) VALUES ('rebuild')")
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite older than 3.34 has no trigram tokenizer
+            self.fts = False
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _file_record(self, file_path):
+        return self.conn.execute(
+            "SELECT id, mtime, size FROM files WHERE path = ?", (os.path.abspath(file_path),)
+        ).fetchone()
+
+    def is_current(self, file_path):
+        """True if the file is indexed and unchanged since it was indexed"""
+        record = self._file_record(file_path)
+        if record is None:
+            return False
+        stat = os.stat(file_path)
+        return record[1] == stat.st_mtime and record[2] == stat.st_size
+
+    def remove_file(self, file_path):
+        record = self._file_record(file_path)
+        if record is not None:
+            self._delete_file_id(record[0])
+
+    def _delete_file_id(self, file_id):
+        sheet_ids = "SELECT id FROM sheets WHERE file_id = ?"
+        if self.fts:
+            self.conn.execute(
+                "INSERT INTO cells_fts(cells_fts, rowid, norm) "
+                f"SELECT 'delete', id, norm FROM cells WHERE sheet_id IN ({sheet_ids})", (file_id,)
+            )
+        self.conn.execute(f"DELETE FROM cells WHERE sheet_id IN ({sheet_ids})", (file_id,))
+        self.conn.execute("DELETE FROM sheets WHERE file_id = ?", (file_id,))
+        self.conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def index_file(self, file_path, fingerprint=None):
+        """
+        (Re)index one workbook, trying the engines in order. Each attempt runs in
+        its own transaction so a half-read file never stays in the index.
+        Returns the number of cells stored.
+        """
+        file_path = os.path.abspath(file_path)
+        fingerprint = fingerprint or file_fingerprint(file_path, with_hash=True)
+        last_error = ""
+
+        for engine_config in route_engines(file_path, learned_engine(file_path)):
+            engine = engine_config['engine']
+            if engine == 'xlsx-zip':
+                continue
+
+            try:
+                with self.conn:
+                    self.remove_file(file_path)
+                    file_id = self.conn.execute(
+                        "INSERT INTO files (path, mtime, size, hash, engine) VALUES (?, ?, ?, ?, ?)",
+                        (file_path, fingerprint['mtime'], fingerprint['size'], fingerprint['hash'], engine)
+                    ).lastrowid
+
+                    sheet_ids = {}
+                    widths = {}
+                    cell_count = 0
+                    first_cell_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM cells").fetchone()[0]
+                    for sheet_name, row_idx, values in iter_workbook_rows(file_path, engine, engine_config['options']):
+                        if sheet_name not in sheet_ids:
+                            sheet_ids[sheet_name] = self.conn.execute(
+                                "INSERT INTO sheets (file_id, position, name) VALUES (?, ?, ?)",
+                                (file_id, len(sheet_ids), sheet_name)
+                            ).lastrowid
+                        sheet_id = sheet_ids[sheet_name]
+                        widths[sheet_id] = max(widths.get(sheet_id, 0), len(values))
+
+                        cursor = self.conn.executemany(
+                            "INSERT INTO cells (sheet_id, row, col, text, norm) VALUES (?, ?, ?, ?, ?)",
+                            [(sheet_id, row_idx, col, text, normalize_text(text)) for col, text in enumerate(values) if text]
+                        )
+                        cell_count += cursor.rowcount
+
+                    self.conn.executemany("UPDATE sheets SET width = ? WHERE id = ?",
+                                          [(width, sheet_id) for sheet_id, width in widths.items()])
+                    if self.fts:
+                        self.conn.execute(
+                            "INSERT INTO cells_fts(rowid, norm) SELECT id, norm FROM cells WHERE id >= ?",
+                            (first_cell_id,)
+                        )
+                return cell_count
+
+            except Exception as e:
+                last_error = str(e)
+                continue
+
+        raise Exception(f"建立索引失败: {last_error}")
+
+    def update(self, folders=(), file_paths=(), with_hash=True, on_file_done=None, cancel_event=None,
+               scan_options=None):
+        """
+        Incremental update over the given folders (walked with iter_excel_files
+        and scan_options) and files. Unchanged files
+        (same path, mtime and size) are skipped, new and changed files are
+        re-parsed, indexed files under the folders that no longer exist are
+        purged, and a new path whose content hash matches a vanished file is
+        treated as a move: only its path is updated, nothing is parsed.
+        on_file_done(file_path, error) is called for every file that is parsed.
+        Returns counts per outcome.
+        """
+        summary = {'unchanged': 0, 'added': 0, 'changed': 0, 'moved': 0, 'deleted': 0, 'failed': 0}
+        folders = [os.path.abspath(folder) for folder in folders]
+
+        current_paths = {}
+        for folder_paths in [file_paths] + [iter_excel_files(folder, **(scan_options or {})) for folder in folders]:
+            for file_path in folder_paths:
+                # A dict keeps the order and finds duplicates among tens of thousands of paths
+                current_paths.setdefault(os.path.abspath(file_path), None)
+
+        indexed = {
+            path: (file_id, mtime, size, content_hash)
+            for file_id, path, mtime, size, content_hash
+            in self.conn.execute("SELECT id, path, mtime, size, hash FROM files")
+        }
+
+        # Indexed files under the scanned folders that are gone from disk
+        vanished = {}
+        for path, record in indexed.items():
+            in_scope = any(path.startswith(folder + os.sep) for folder in folders) or path in current_paths
+            if in_scope and not os.path.exists(path):
+                vanished[path] = record
+
+        for file_path in current_paths:
+            if cancel_event is not None and cancel_event.is_set():
+                return summary
+
+            try:
+                fingerprint = file_fingerprint(file_path)
+                record = indexed.get(file_path)
+                if record is not None and record[1] == fingerprint['mtime'] and record[2] == fingerprint['size']:
+                    summary['unchanged'] += 1
+                    continue
+
+                if with_hash:
+                    fingerprint = file_fingerprint(file_path, with_hash=True)
+
+                if record is None and fingerprint['hash']:
+                    moved_from = next((path for path, (_, _, size, content_hash) in vanished.items()
+                                       if size == fingerprint['size'] and content_hash == fingerprint['hash']), None)
+                    if moved_from is not None:
+                        with self.conn:
+                            self.conn.execute(
+                                "UPDATE files SET path = ?, mtime = ? WHERE id = ?",
+                                (file_path, fingerprint['mtime'], vanished.pop(moved_from)[0])
+                            )
+                        summary['moved'] += 1
+                        continue
+
+            except OSError as e:
+                summary['failed'] += 1
+                if on_file_done is not None:
+                    on_file_done(file_path, str(e))
+                continue
+
+            error = None
+            try:
+                self.index_file(file_path, fingerprint)
+                summary['changed' if record is not None else 'added'] += 1
+            except Exception as e:
+                error = str(e)
+                summary['failed'] += 1
+            if on_file_done is not None:
+                on_file_done(file_path, error)
+
+        with self.conn:
+            for record in vanished.values():
+                self._delete_file_id(record[0])
+        summary['deleted'] = len(vanished)
+        return summary
+
+    def _candidate_cells(self, matcher, file_ids):
+        """Cells of the given files that may contain the term"""
+        placeholders = ",".join("?" * len(file_ids))
+        # Terms are looked up folded, in the folded cell text, so a cell that only
+        # matches after folding (Straße for strasse, ① for 1) is still a candidate
+        terms = [term for term in dict.fromkeys(normalize_text(term) for term in getattr(matcher, 'index_terms', None) or []) if term]
+        # The trigram tokenizer can only look up terms of three or more characters;
+        # shorter ones are filtered by instr() in SQLite
+        long_terms = [term for term in terms if len(term) >= 3]
+        short_terms = [term for term in terms if len(term) < 3]
+        fts_query = " OR ".join('"' + term.replace('"', '""') + '"' for term in long_terms)
+        if terms and not short_terms and self.fts:
+            return self.conn.execute(
+                "SELECT c.sheet_id, c.row, c.text FROM cells_fts "
+                "JOIN cells c ON c.id = cells_fts.rowid "
+                "JOIN sheets s ON s.id = c.sheet_id "
+                f"WHERE cells_fts MATCH ? AND s.file_id IN ({placeholders})",
+                [fts_query] + list(file_ids)
+            )
+        if short_terms and (self.fts or not long_terms) and len(short_terms) <= SHORT_TERMS_LIMIT:
+            conditions = ["instr(c.norm, ?) > 0"] * len(short_terms)
+            params = list(file_ids) + short_terms
+            if long_terms:
+                conditions.append("c.id IN (SELECT rowid FROM cells_fts WHERE cells_fts MATCH ?)")
+                params.append(fts_query)
+            return self.conn.execute(
+                "SELECT c.sheet_id, c.row, c.text FROM cells c JOIN sheets s ON s.id = c.sheet_id "
+                f"WHERE s.file_id IN ({placeholders}) AND ({' OR '.join(conditions)})",
+                params
+            )
+        return self.conn.execute(
+            "SELECT c.sheet_id, c.row, c.text FROM cells c JOIN sheets s ON s.id = c.sheet_id "
+            f"WHERE s.file_id IN ({placeholders})",
+            list(file_ids)
+        )
+
+    def _load_rows(self, sheet_id, rows, width):
+        """Rebuild the matching rows of one sheet as a DataFrame"""
+        rows = sorted(rows)
+        data = {row: [""] * width for row in rows}
+        for start in range(0, len(rows), 500):
+            chunk = rows[start:start + 500]
+            for row, col, text in self.conn.execute(
+                f"SELECT row, col, text FROM cells WHERE sheet_id = ? AND row IN ({','.join('?' * len(chunk))})",
+                [sheet_id] + chunk
+            ):
+                data[row][col] = text
+        return pd.DataFrame([data[row] for row in rows], index=rows, dtype=str)
+
+    def load_sheet_rows(self, file_path, sheet_name, rows, width):
+        """Rows of one indexed sheet as lists of cell texts, in the order asked"""
+        record = self._file_record(file_path)
+        sheet = None
+        if record is not None:
+            sheet = self.conn.execute(
+                "SELECT id FROM sheets WHERE file_id = ? AND name = ?", (record[0], sheet_name)
+            ).fetchone()
+        if sheet is None:
+            raise ValueError(f"[{sheet_name}] 索引中没有该工作表")
+        df = self._load_rows(sheet[0], rows, width).reindex(index=rows, fill_value="")
+        return df.to_numpy(dtype=object).tolist()
+
+    def search(self, file_paths, matcher, count_only=False):
+        """
+        Answer a search from the index. Returns (results, missing): results is
+        {absolute file path: {sheet_name: SheetHits}} for indexed, unchanged files
+        (keyed by path, since workbooks in different folders often share a name);
+        missing lists the paths that need live parsing.
+        count_only skips locating the hit cells.
+        """
+        file_ids = {}
+        missing = []
+        for file_path in file_paths:
+            try:
+                current = self.is_current(file_path)
+            except OSError:
+                current = False
+            if current:
+                file_ids[self._file_record(file_path)[0]] = os.path.abspath(file_path)
+            else:
+                missing.append(file_path)
+
+        hits = {}
+        for file_id_chunk in [list(file_ids)[i:i + 500] for i in range(0, len(file_ids), 500)]:
+            for sheet_id, row, text in self._candidate_cells(matcher, file_id_chunk):
+                if matcher.match_text(text):
+                    hits.setdefault(sheet_id, set()).add(row)
+
+        results_by_path = {}
+        for sheet_id, rows in hits.items():
+            file_id, sheet_name, width = self.conn.execute(
+                "SELECT file_id, name, width FROM sheets WHERE id = ?", (sheet_id,)
+            ).fetchone()
+            df = self._load_rows(sheet_id, rows, width)
+            header = None
+            if getattr(matcher, 'row_level', False):
+                # Candidate rows hold a required term; the full query decides
+                header = matcher.find_header(self._load_rows(sheet_id, range(matcher.HEADER_SCAN_ROWS), width))
+            sheet_hits = frame_hits(sheet_name, df, matcher, header, count_only=count_only)
+            if sheet_hits is None:
+                continue
+            results_by_path.setdefault(file_ids[file_id], {})[(sheet_id, sheet_name)] = sheet_hits
+
+        results = {}
+        for file_path, file_results in results_by_path.items():
+            # Sheets in workbook order
+            results[file_path] = {sheet_name: sheet_hits for (_, sheet_name), sheet_hits in sorted(file_results.items())}
+        return results, missing
+
+class IndexRowSource:
+    """Reads result rows of an indexed, unchanged workbook back from the index"""
+
+    def __init__(self, db_path, file_path):
+        self.db_path = db_path
+        self.file_path = file_path
+
+    def load(self, sheet_name, rows, width):
+        # Own connection: rows are loaded from whichever thread shows them
+        with SheetIndex(self.db_path) as index:
+            return index.load_sheet_rows(self.file_path, sheet_name, rows, width)
@@ -0,0 +1,1190 @@
+"""Matchers for every search mode, the query language and make_matcher()"""
+import pandas as pd
+import numpy as np
+from pathlib import Path
+import time
+import re
+try:
+    from re import _parser as sre_parse
+    from re import _compiler as sre_compile
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_compile
+
+from sheetsearch.engines import WorkbookSession, is_package_installed
+from sheetsearch.columns import (
+    NUMERIC_TEXT_CHARS,
+    SORTED_INDEX_MIN_ROWS,
+    ValueRange,
+    _column_index,
+    normalize_text,
+    normalized_columns,
+    typed_columns
+)
+from sheetsearch.options import variant_folding_available
+
+def _column_text(df, position, rows):
+    """Text of column position for rows (positions in df), as a string Series"""
+    values = df.iloc[:, position] if len(rows) == len(df) else df.iloc[rows, position]
+    if not pd.api.types.is_string_dtype(values):
+        values = values.astype(str)
+    return values
+
+def _mask_rows(matcher, df):
+    """
+    Row mask from matcher._column_hits, column by column; each column after
+    the first only looks at the rows that have not matched yet.
+    """
+    mask = np.zeros(len(df), dtype=bool)
+    for position in range(df.shape[1]):
+        pending = np.flatnonzero(~mask)
+        if not len(pending):
+            break
+        mask[pending[matcher._column_hits(df, position, pending)]] = True
+    return mask
+
+def _mask_cells(matcher, df, rows=None):
+    """(row positions, column positions) of the matching cells of df, within rows if given"""
+    rows = np.arange(len(df)) if rows is None else np.asarray(rows, dtype=np.int64)
+    hit_rows = [np.zeros(0, dtype=np.int64)]
+    hit_cols = [np.zeros(0, dtype=np.int64)]
+    for position in range(df.shape[1]):
+        hits = rows[matcher._column_hits(df, position, rows)]
+        hit_rows.append(hits)
+        hit_cols.append(np.full(len(hits), position, dtype=np.int64))
+    return np.concatenate(hit_rows), np.concatenate(hit_cols)
+
+class LiteralMatcher:
+    """
+    Plain substring matcher that builds the row mask column by column with
+    vectorized string operations instead of a Python call per row.
+    Columns after the first only look at rows that have not matched yet.
+    Insensitive matching (case, width, optionally traditional/simplified) runs
+    as a plain substring scan over the cached normalized columns.
+    """
+
+    def __init__(self, search_term, case_sensitive=False, fold_variants=False):
+        self.search_term = search_term
+        self.case_sensitive = case_sensitive
+        self.fold_variants = fold_variants
+        self.normalizes = not case_sensitive or fold_variants
+        self.normalized_term = normalize_text(search_term, case_sensitive, fold_variants) if self.normalizes else search_term
+        # Literals of which a matching cell contains at least one (used by the
+        # index, which folds width and case itself)
+        self.index_terms = [] if fold_variants else [search_term]
+        self.timed_out = False
+
+    def begin_file(self):
+        """Called before each file; only time-limited matchers use it"""
+
+    def match_text(self, text):
+        if self.normalizes:
+            return self.normalized_term in normalize_text(text, self.case_sensitive, self.fold_variants)
+        return self.search_term in text
+
+    def may_match_numeric(self):
+        """Whether the term could occur in a rendered number, date, time or boolean"""
+        if set(self.search_term.lower()) <= NUMERIC_TEXT_CHARS:
+            return True
+        return self.match_text("True") or self.match_text("False")
+
+    def match_row(self, values):
+        # "\x00" never appears in cell text, so a hit cannot span two cells
+        return self.match_text("\x00".join(values))
+
+    def _column_hits(self, df, position, rows):
+        """Which of rows (positions in df) hold the term in column position"""
+        if self.normalizes:
+            column = normalized_columns(df, self.case_sensitive, self.fold_variants)[position]
+            # Few rows left: test those cells directly instead of scanning the column
+            if len(rows) * 16 < len(df):
+                return np.array([self.normalized_term in column.cell(row) for row in rows], dtype=bool)
+            contained = np.zeros(len(df), dtype=bool)
+            contained[column.rows_containing(self.normalized_term)] = True
+            return contained[rows]
+
+        return _column_text(df, position, rows).str.contains(
+            self.search_term,
+            case=True,
+            regex=False,
+            na=False
+        ).to_numpy(dtype=bool)
+
+    def row_mask(self, df):
+        return _mask_rows(self, df)
+
+    def cell_hits(self, df, header=None, rows=None):
+        """(row positions, column positions) of the matching cells of df, within rows if given"""
+        return _mask_cells(self, df, rows)
+
+class MultiTermMatcher:
+    """
+    Match many literal terms at once with an Aho-Corasick automaton: one pass
+    over each cell finds every term it contains, so the cost hardly depends on
+    the number of terms. Columns are matched over their distinct values only.
+    annotate() tags result rows with the terms they contain ("匹配词").
+    """
+
+    TAG_COLUMN = "匹配词"
+
+    def __init__(self, terms, case_sensitive=False, fold_variants=False):
+        self.case_sensitive = case_sensitive
+        self.fold_variants = fold_variants
+        self.normalizes = not case_sensitive or fold_variants
+        self.terms = []
+        seen = set()
+        for term in terms:
+            key = self._normalize(term)
+            if term and key not in seen:
+                seen.add(key)
+                self.terms.append(term)
+        self.search_term = "; ".join(self.terms)
+        self.index_terms = list(self.terms)
+        self.timed_out = False
+        self._build()
+
+    def begin_file(self):
+        pass
+
+    def _normalize(self, text):
+        return normalize_text(text, self.case_sensitive, self.fold_variants) if self.normalizes else text
+
+    def _build(self):
+        # goto[state] maps a character to the next state; out[state] holds term indexes
+        goto = [{}]
+        out = [()]
+        for term_id, term in enumerate(self.terms):
+            state = 0
+            for ch in self._normalize(term):
+                next_state = goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][ch] = next_state
+                    goto.append({})
+                    out.append(())
+                state = next_state
+            out[state] = out[state] + (term_id,)
+
+        fail = [0] * len(goto)
+        queue_states = list(goto[0].values())
+        for state in queue_states:
+            for ch, next_state in goto[state].items():
+                queue_states.append(next_state)
+                fallback = fail[state]
+                while fallback and ch not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(ch, 0)
+                out[next_state] = out[next_state] + out[fail[next_state]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+        self._alphabet = set().union(*goto) if goto else set()
+
+    def find_terms(self, text, first_only=False):
+        """Indexes of the terms occurring in text"""
+        return self._scan(self._normalize(text), first_only)
+
+    def _scan(self, text, first_only=False):
+        """find_terms for text that is already normalized"""
+        goto, fail, out, alphabet = self._goto, self._fail, self._out, self._alphabet
+        found = set()
+        state = 0
+        for ch in text:
+            if ch not in alphabet:
+                state = 0
+                continue
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+                if first_only:
+                    break
+        return found
+
+    def match_text(self, text):
+        return bool(self.terms) and bool(self.find_terms(text, first_only=True))
+
+    def may_match_numeric(self):
+        return any(LiteralMatcher(term, self.case_sensitive, self.fold_variants).may_match_numeric() for term in self.terms)
+
+    def match_row(self, values):
+        return self.match_text("\x00".join(values))
+
+    def _column_hits(self, df, position, rows):
+        if not self.terms:
+            return np.zeros(len(rows), dtype=bool)
+        if self.normalizes:
+            # Cells are normalized once per sheet; only the automaton runs here
+            column = normalized_columns(df, self.case_sensitive, self.fold_variants)[position]
+            if len(rows) * 16 < len(df):
+                values = np.array([column.cell(row) for row in rows], dtype=object)
+            else:
+                values = np.array(column.cells(), dtype=object)[rows]
+        else:
+            values = _column_text(df, position, rows).to_numpy(dtype=object)
+        codes, uniques = pd.factorize(values)
+        unique_hits = np.fromiter((bool(self._scan(value, first_only=True)) for value in uniques), dtype=bool, count=len(uniques))
+        hits = np.zeros(len(codes), dtype=bool)
+        valid = codes >= 0
+        hits[valid] = unique_hits[codes[valid]]
+        return hits
+
+    def row_mask(self, df):
+        return _mask_rows(self, df)
+
+    def cell_hits(self, df, header=None, rows=None):
+        return _mask_cells(self, df, rows)
+
+    def annotate(self, df, rows=None):
+        """Return df (only the given row positions) with a leading column listing the terms each row contains"""
+        if rows is not None:
+            df = df.iloc[rows]
+        if self.TAG_COLUMN in df.columns:
+            return df
+        tags = []
+        for values in df.astype(str).to_numpy(dtype=object).tolist():
+            found = self.find_terms("\x00".join(values))
+            tags.append(", ".join(self.terms[term_id] for term_id in sorted(found)))
+        result = df.copy()
+        result.insert(0, self.TAG_COLUMN, pd.Series(tags, index=df.index, dtype=str))
+        return result
+
+REGEX_FILE_TIME_LIMIT = 10.0
+
+class MatchTimeout(TimeoutError):
+    pass
+
+def _is_unbounded_repeat(op, av):
+    return op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[1] == sre_parse.MAXREPEAT
+
+def _find_nested_repeat(parsed, inside_repeat=False):
+    """True if an unbounded repeat contains another unbounded repeat, like (a+)+"""
+    for op, av in parsed:
+        if _is_unbounded_repeat(op, av):
+            if inside_repeat:
+                return True
+            if _find_nested_repeat(av[2], True):
+                return True
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            if _find_nested_repeat(av[2], inside_repeat):
+                return True
+        elif op is sre_parse.SUBPATTERN:
+            if _find_nested_repeat(av[-1], inside_repeat):
+                return True
+        elif op is sre_parse.BRANCH:
+            if any(_find_nested_repeat(branch, inside_repeat) for branch in av[1]):
+                return True
+        # Possessive repeats and atomic groups never backtrack into their body
+    return False
+
+# Every character of the Basic Multilingual Plane, to list the characters a
+# single-character pattern accepts
+_BMP_CHARS = None
+
+def _single_char_set(item, state):
+    """Characters (of the BMP) one LITERAL/IN/ANY/... item accepts"""
+    global _BMP_CHARS
+    if _BMP_CHARS is None:
+        _BMP_CHARS = "".join(map(chr, range(0x10000)))
+    compiled = sre_compile.compile(sre_parse.SubPattern(state, [item]), state.flags)
+    return frozenset(match.group() for match in compiled.finditer(_BMP_CHARS))
+
+def _first_chars(items, state):
+    """
+    (characters a match of items can start with, whether items can match empty).
+    None stands for any character, for constructs not worth analysing.
+    """
+    chars = set()
+    for op, av in items:
+        if op is sre_parse.AT:
+            continue
+        if op in (sre_parse.LITERAL, sre_parse.NOT_LITERAL, sre_parse.IN, sre_parse.ANY):
+            return chars | _single_char_set((op, av), state), False
+        if op is sre_parse.SUBPATTERN:
+            first, nullable = _first_chars(av[-1], state)
+        elif op is sre_parse.BRANCH:
+            first, nullable = set(), False
+            for branch in av[1]:
+                branch_first, branch_nullable = _first_chars(branch, state)
+                if branch_first is None:
+                    return None, True
+                first |= branch_first
+                nullable = nullable or branch_nullable
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            first, nullable = _first_chars(av[2], state)
+            nullable = nullable or av[0] == 0
+        else:
+            return None, True
+        if first is None:
+            return None, True
+        chars |= first
+        if not nullable:
+            return chars, False
+    return chars, True
+
+def _find_overlapping_branch(parsed, state, inside_repeat=False):
+    """
+    True if an unbounded repeat contains an alternation whose branches can
+    start with the same character or match nothing, like (a|aa)+ or (\w|x)+:
+    the repeat can then split one text in exponentially many ways.
+    """
+    for op, av in parsed:
+        if op is sre_parse.BRANCH:
+            if inside_repeat:
+                seen = set()
+                for branch in av[1]:
+                    first, nullable = _first_chars(branch, state)
+                    if first is None or nullable or seen & first:
+                        return True
+                    seen |= first
+            if any(_find_overlapping_branch(branch, state, inside_repeat) for branch in av[1]):
+                return True
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            if _find_overlapping_branch(av[2], state, inside_repeat or _is_unbounded_repeat(op, av)):
+                return True
+        elif op is sre_parse.SUBPATTERN:
+            if _find_overlapping_branch(av[-1], state, inside_repeat):
+                return True
+    return False
+
+def _required_literals(parsed, ignore_case):
+    """
+    Literal substrings that every match of the parsed pattern contains. Under
+    ignore_case only characters whose case folding is plain (ASCII or caseless)
+    are kept, so the prefilter can never reject a real match.
+    """
+    literals = []
+    run = []
+
+    def flush():
+        if run:
+            literals.append("".join(run))
+            run.clear()
+
+    for op, av in parsed:
+        if op is sre_parse.LITERAL:
+            ch = chr(av)
+            if ignore_case and not (ch.isascii() or ch.lower() == ch.upper()):
+                flush()
+            else:
+                run.append(ch)
+        elif op is sre_parse.AT:
+            # Anchors are zero-width and do not break a literal run
+            continue
+        elif op is sre_parse.SUBPATTERN:
+            flush()
+            add_flags, del_flags = av[1], av[2]
+            if not (add_flags | del_flags) & re.IGNORECASE:
+                literals.extend(_required_literals(av[-1], ignore_case))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) or op is getattr(sre_parse, 'POSSESSIVE_REPEAT', None):
+            flush()
+            if av[0] >= 1:
+                literals.extend(_required_literals(av[2], ignore_case))
+        else:
+            flush()
+    flush()
+    return literals
+
+class RegexMatcher:
+    """
+    Regular expression matcher. The pattern is compiled once; the longest literal
+    that every match must contain is pulled out of it and used to drop cells,
+    columns and (through the shared-string pre-filter) whole sheets with a cheap
+    substring test before the regex runs.
+    Patterns with nested unbounded repeats, or with an alternation under an
+    unbounded repeat whose branches overlap, are refused. Each file also gets a
+    time budget: once it is spent every further match raises MatchTimeout and
+    the file is reported as an error. With the optional regex package the limit
+    also interrupts a single slow match.
+    """
+
+    def __init__(self, pattern, case_sensitive=False, time_limit=REGEX_FILE_TIME_LIMIT):
+        flags = 0 if case_sensitive else re.IGNORECASE
+        try:
+            self.compiled = re.compile(pattern, flags)
+            parsed = sre_parse.parse(pattern, flags)
+        except re.error as e:
+            raise ValueError(f"正则表达式无效: {e}")
+        if _find_nested_repeat(parsed):
+            raise ValueError("正则表达式含有嵌套的重复（如 (a+)+），可能导致灾难性回溯")
+        if _find_overlapping_branch(parsed, parsed.state):
+            raise ValueError("正则表达式在重复中含有可能重叠的分支（如 (a|aa)+），可能导致灾难性回溯")
+
+        self.search_term = pattern
+        self.case_sensitive = not self.compiled.flags & re.IGNORECASE
+        literals = _required_literals(parsed, not self.case_sensitive)
+        self.literal = max(literals, key=len) if literals else ""
+        self.index_terms = [self.literal] if self.literal else []
+        self.time_limit = time_limit
+        self.timeout_message = f"正则匹配超过 {time_limit:g} 秒，已跳过此文件（可能存在灾难性回溯）" if time_limit else ""
+        self.deadline = None
+        self.timed_out = False
+        self._timeout_engine = None
+        if time_limit and is_package_installed('regex'):
+            import regex
+            self._timeout_engine = regex.compile(pattern, regex.IGNORECASE if not self.case_sensitive else 0)
+
+    def __getstate__(self):
+        # The regex package pattern is rebuilt in each worker process
+        state = self.__dict__.copy()
+        state['_timeout_engine'] = None
+        state['_use_timeout_engine'] = self._timeout_engine is not None
+        return state
+
+    def __setstate__(self, state):
+        use_timeout_engine = state.pop('_use_timeout_engine', False)
+        self.__dict__.update(state)
+        if use_timeout_engine:
+            import regex
+            self._timeout_engine = regex.compile(self.search_term, regex.IGNORECASE if not self.case_sensitive else 0)
+
+    def begin_file(self):
+        self.timed_out = False
+        self.deadline = time.perf_counter() + self.time_limit if self.time_limit else None
+
+    def _search(self, text):
+        if self.deadline is None:
+            return self.compiled.search(text) is not None
+        remaining = self.deadline - time.perf_counter()
+        if remaining <= 0 or self.timed_out:
+            self.timed_out = True
+            raise MatchTimeout(self.timeout_message)
+        if self._timeout_engine is not None:
+            try:
+                return self._timeout_engine.search(text, timeout=remaining) is not None
+            except TimeoutError:
+                self.timed_out = True
+                raise MatchTimeout(self.timeout_message)
+        return self.compiled.search(text) is not None
+
+    def _has_literal(self, text):
+        if self.case_sensitive:
+            return self.literal in text
+        return self.literal.casefold() in text.casefold()
+
+    def match_text(self, text):
+        if self.literal and not self._has_literal(text):
+            return False
+        return self._search(text)
+
+    def may_match_numeric(self):
+        if not self.literal:
+            return True
+        return LiteralMatcher(self.literal, self.case_sensitive).may_match_numeric()
+
+    def match_row(self, values):
+        # Cells are tested one by one so a pattern cannot match across cells
+        return any(self.match_text(value) for value in values)
+
+    def _column_hits(self, df, position, rows):
+        values = _column_text(df, position, rows)
+        hits = np.zeros(len(values), dtype=bool)
+        candidates = np.arange(len(values))
+        if self.literal:
+            # Cheap vectorized substring test first; the regex only sees survivors
+            candidates = np.flatnonzero(values.str.contains(self.literal, case=self.case_sensitive, regex=False, na=False).to_numpy(dtype=bool))
+            if not len(candidates):
+                return hits
+
+        codes, uniques = pd.factorize(values.iloc[candidates])
+        unique_hits = np.fromiter((self._search(value) for value in uniques), dtype=bool, count=len(uniques))
+        valid = codes >= 0
+        hits[candidates[valid]] = unique_hits[codes[valid]]
+        return hits
+
+    def row_mask(self, df):
+        return _mask_rows(self, df)
+
+    def cell_hits(self, df, header=None, rows=None):
+        return _mask_cells(self, df, rows)
+
+class FuzzyMatcher:
+    """
+    Approximate matcher: a cell matches if some substring of it is within
+    max_distance edits of the term, after NFKC and (optionally) case folding.
+    Cells are first narrowed with a q-gram count filter (a match with k edits
+    keeps at least m - q + 1 - k*q of the term's q-grams), run as one regex pass
+    over each normalized column, then confirmed with Myers' bit-parallel edit
+    distance.
+    annotate() adds the distance of each row ("编辑距离") and ranks by it.
+    """
+
+    TAG_COLUMN = "编辑距离"
+
+    def __init__(self, search_term, case_sensitive=False, max_distance=1, fold_variants=False):
+        self.search_term = search_term
+        self.case_sensitive = case_sensitive
+        self.fold_variants = fold_variants
+        self.max_distance = max_distance
+        self.term = normalize_text(search_term, case_sensitive, fold_variants)
+        self.timed_out = False
+        m = len(self.term)
+        if m <= max_distance:
+            raise ValueError("模糊匹配的搜索词长度必须大于编辑距离")
+
+        # Longest q (up to 3) for which the count filter still requires a shared q-gram
+        self.q = 0
+        for q in (3, 2, 1):
+            if m - q + 1 - max_distance * q >= 1:
+                self.q = q
+                break
+        self.grams = [self.term[i:i + self.q] for i in range(m - self.q + 1)] if self.q else []
+        self.min_grams = m - self.q + 1 - max_distance * self.q if self.q else 0
+        # A match runs on to the end of its cell, so there is one match per cell
+        self.gram_regex = re.compile("(?:" + "|".join(re.escape(gram) for gram in sorted(set(self.grams))) + ")[^\x00]*")
+
+        # The index can fetch candidates by trigram when every match shares one
+        self.index_terms = []
+        if self.q == 3 and not fold_variants:
+            self.index_terms = sorted(set(self.grams))
+
+        self.peq = {}
+        for i, ch in enumerate(self.term):
+            self.peq[ch] = self.peq.get(ch, 0) | (1 << i)
+        # Column distances of the last sheet: row_mask, cell_hits and annotate
+        # all need them. (normalized columns list, [distances or None, ...])
+        self._sheet_distances = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_sheet_distances'] = None
+        return state
+
+    def begin_file(self):
+        self._sheet_distances = None
+
+    def distance(self, text):
+        """Smallest edit distance between the term and any substring of text (normalized)"""
+        m = len(self.term)
+        mask = (1 << m) - 1
+        high = 1 << (m - 1)
+        peq = self.peq
+        pv = mask
+        mv = 0
+        score = m
+        best = m
+        for ch in text:
+            eq = peq.get(ch, 0)
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | (~(xh | pv) & mask)
+            mh = pv & xh
+            if ph & high:
+                score += 1
+            elif mh & high:
+                score -= 1
+                if score < best:
+                    best = score
+                    if best == 0:
+                        break
+            ph = (ph << 1) & mask
+            mh = (mh << 1) & mask
+            pv = mh | (~(xv | ph) & mask)
+            mv = ph & xv
+        return best
+
+    def _passes_filter(self, text):
+        if len(text) < len(self.term) - self.max_distance:
+            return False
+        if self.min_grams <= 0:
+            return True
+        if self.min_grams == 1:
+            return any(gram in text for gram in self.grams)
+        q = self.q
+        text_grams = {text[i:i + q] for i in range(len(text) - q + 1)}
+        return sum(gram in text_grams for gram in self.grams) >= self.min_grams
+
+    def text_distance(self, text):
+        """Edit distance of a raw cell, or None if it is not within max_distance"""
+        text = normalize_text(text, self.case_sensitive, self.fold_variants)
+        if not self._passes_filter(text):
+            return None
+        distance = self.distance(text)
+        return distance if distance <= self.max_distance else None
+
+    def match_text(self, text):
+        return self.text_distance(text) is not None
+
+    def may_match_numeric(self):
+        # Number text only holds digits and a few symbols; every other term character costs an edit
+        if sum(ch not in NUMERIC_TEXT_CHARS for ch in self.term) <= self.max_distance:
+            return True
+        return self.match_text("True") or self.match_text("False")
+
+    def match_row(self, values):
+        return any(self.match_text(value) for value in values)
+
+    def _column_distances(self, column):
+        """Distances for a NormalizedColumn (np.inf where there is no match)"""
+        candidates = column.lengths >= len(self.term) - self.max_distance
+        if self.min_grams >= 1 and candidates.any():
+            # One regex pass over the whole column finds the cells sharing a q-gram
+            # (the NUL cell separator ends each match)
+            gram_starts = np.fromiter((match.start() for match in self.gram_regex.finditer(column.text)), dtype=np.int64)
+            has_gram = np.zeros(len(column), dtype=bool)
+            has_gram[column.rows_at(gram_starts)] = True
+            candidates &= has_gram
+
+        distances = np.full(len(column), np.inf)
+        # Cells holding the term itself are at distance 0 without running Myers
+        exact = column.rows_containing(self.term)
+        distances[exact] = 0
+        candidates[exact] = False
+        # Repeated cell texts are computed once
+        known = {}
+        for row in np.flatnonzero(candidates).tolist():
+            text = column.cell(row)
+            distance = known.get(text)
+            if distance is None:
+                distance = self.distance(text) if self._passes_filter(text) else np.inf
+                known[text] = distance
+            if distance <= self.max_distance:
+                distances[row] = distance
+        return distances
+
+    def _sheet_column_distances(self, df, position):
+        columns = normalized_columns(df, self.case_sensitive, self.fold_variants)
+        if self._sheet_distances is None or self._sheet_distances[0] is not columns:
+            self._sheet_distances = (columns, [None] * len(columns))
+        distances = self._sheet_distances[1]
+        if distances[position] is None:
+            distances[position] = self._column_distances(columns[position])
+        return distances[position]
+
+    def row_distances(self, df):
+        """Best distance per row over all columns (np.inf for rows without a match)"""
+        best = np.full(len(df), np.inf)
+        for position in range(df.shape[1]):
+            np.minimum(best, self._sheet_column_distances(df, position), out=best)
+        return best
+
+    def _column_hits(self, df, position, rows):
+        return np.isfinite(self._sheet_column_distances(df, position))[rows]
+
+    def row_mask(self, df):
+        return np.isfinite(self.row_distances(df))
+
+    def cell_hits(self, df, header=None, rows=None):
+        return _mask_cells(self, df, rows)
+
+    def annotate(self, df, rows=None):
+        """Return df (only the given row positions) with a leading distance column, best matches first"""
+        if self.TAG_COLUMN in df.columns:
+            return df if rows is None else df.iloc[rows]
+        # Distances come from the whole sheet, whose columns are already matched
+        distances = self.row_distances(df)
+        if rows is not None:
+            df = df.iloc[rows]
+            distances = distances[rows]
+        result = df.copy()
+        result.insert(0, self.TAG_COLUMN, pd.Series(distances, index=df.index).astype(int).astype(str))
+        order = np.argsort(distances, kind='stable')
+        return result.iloc[order]
+
+QUERY_OPERATORS = {'AND': 'and', 'OR': 'or', 'NOT': 'not'}
+
+def _tokenize_query(text):
+    """Tokens: ('(' / ')'), ('op', 'and'|'or'|'not') and ('term', column, text, quoted)"""
+    tokens = []
+    position = 0
+    quotes = {'"': '"', '“': '”'}
+    while position < len(text):
+        ch = text[position]
+        if ch.isspace():
+            position += 1
+            continue
+        if ch in '()（）':
+            tokens.append(('(' if ch in '(（' else ')',))
+            position += 1
+            continue
+
+        # Optional column qualifier before ':' (ASCII or full-width colon); a
+        # numeric prefix is a value such as a time (10:30), not a column
+        column = None
+        match = re.match(r'([^\s:：()（）"“”]+)[:：]', text[position:])
+        if match and not re.fullmatch(r'[\d.,\-]+', match.group(1)):
+            column = match.group(1)
+            position += match.end()
+
+        if position < len(text) and text[position] in quotes:
+            closing = quotes[text[position]]
+            end = text.find(closing, position + 1)
+            if end == -1:
+                raise ValueError("查询语法错误: 引号未闭合")
+            tokens.append(('term', column, text[position + 1:end], True))
+            position = end + 1
+            continue
+
+        match = re.match(r'[^\s()（）"“”]+', text[position:])
+        if not match:
+            raise ValueError(f"查询语法错误: 第 {position + 1} 个字符附近缺少搜索词")
+        word = match.group(0)
+        position += match.end()
+        if column is None and word.upper() in QUERY_OPERATORS:
+            tokens.append(('op', QUERY_OPERATORS[word.upper()]))
+        else:
+            tokens.append(('term', column, word, False))
+    return tokens
+
+def parse_query(text):
+    """
+    Parse a boolean query into a tree of ('and', [nodes]), ('or', [nodes]),
+    ('not', node), ('term', column, text) and ('range', column, text). NOT
+    binds tighter than AND, AND tighter than OR, and adjacent terms are joined
+    with AND.
+    Example: 客户:张三 AND NOT 状态:作废 AND 金额:1000..5000
+    """
+    tokens = _tokenize_query(text)
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def parse_or():
+        nonlocal position
+        children = [parse_and()]
+        while peek() == ('op', 'or'):
+            position += 1
+            children.append(parse_and())
+        return children[0] if len(children) == 1 else ('or', children)
+
+    def parse_and():
+        nonlocal position
+        children = [parse_not()]
+        while True:
+            token = peek()
+            if token == ('op', 'and'):
+                position += 1
+            elif token is None or token == ('op', 'or') or token[0] == ')':
+                break
+            children.append(parse_not())
+        return children[0] if len(children) == 1 else ('and', children)
+
+    def parse_not():
+        nonlocal position
+        if peek() == ('op', 'not'):
+            position += 1
+            return ('not', parse_not())
+        return parse_atom()
+
+    def parse_atom():
+        nonlocal position
+        token = peek()
+        if token is None:
+            raise ValueError("查询语法错误: 查询不完整")
+        position += 1
+        if token[0] == '(':
+            node = parse_or()
+            if peek() is None or peek()[0] != ')':
+                raise ValueError("查询语法错误: 括号未闭合")
+            position += 1
+            return node
+        if token[0] == 'term':
+            if not token[2]:
+                raise ValueError("查询语法错误: 搜索词为空")
+            # Unquoted range syntax (1000..5000, >=2025-03) compares typed values
+            if not token[3] and ValueRange.parse(token[2]) is not None:
+                return ('range', token[1], token[2])
+            return ('term', token[1], token[2])
+        raise ValueError(f"查询语法错误: 意外的 {token[-1].upper() if token[0] == 'op' else token[0]}")
+
+    if not tokens:
+        raise ValueError("查询语法错误: 查询为空")
+    node = parse_or()
+    if position != len(tokens):
+        raise ValueError("查询语法错误: 多余的右括号")
+    return node
+
+def _estimate_query(node):
+    """
+    Rough (cost, selectivity) of a query node. Cost counts the columns scanned
+    (an unqualified term scans about ten); longer terms are assumed to match
+    fewer cells, and a qualified term only looks at its own column.
+    """
+    kind = node[0]
+    if kind == 'term':
+        columns = 1 if node[1] is not None else 10
+        return columns, min(1.0, columns * 0.3 ** len(node[2]))
+    if kind == 'range':
+        columns = 1 if node[1] is not None else 10
+        return columns, 0.3
+    if kind == 'not':
+        cost, selectivity = _estimate_query(node[1])
+        return cost, 1.0 - selectivity
+    estimates = [_estimate_query(child) for child in node[1]]
+    cost = sum(cost for cost, _ in estimates)
+    if kind == 'and':
+        return cost, float(np.prod([selectivity for _, selectivity in estimates]))
+    return cost, 1.0 - float(np.prod([1.0 - selectivity for _, selectivity in estimates]))
+
+def plan_query(node):
+    """
+    Reorder AND/OR children for evaluation: AND runs the predicates that drop
+    the most rows per unit of cost first, OR the ones most likely to match.
+    Later predicates then only see the rows still undecided.
+    """
+    kind = node[0]
+    if kind in ('term', 'range'):
+        return node
+    if kind == 'not':
+        return ('not', plan_query(node[1]))
+    children = [plan_query(child) for child in node[1]]
+
+    def rank(child):
+        cost, selectivity = _estimate_query(child)
+        if kind == 'and':
+            return cost / max(1.0 - selectivity, 1e-9)
+        return cost / max(selectivity, 1e-9)
+
+    return (kind, sorted(children, key=rank))
+
+class QueryMatcher:
+    """
+    Row matcher for boolean queries: AND, OR, NOT, quoted phrases and column
+    qualifiers (header text or column letter, e.g. 客户:张三 or C:张三).
+    The query is planned once; each sheet is then evaluated predicate by
+    predicate, each one only on the rows the previous ones left undecided.
+    Qualified queries need the header row, which is not itself a result, so
+    they are never run on the streaming engines. The header is the first of the
+    top rows holding a qualifier's name (so a title block above it is skipped),
+    else the first non-empty row; rows down to the header are never results.
+    Range terms (金额:1000..5000, 日期:2025-03..2025-03) compare the typed
+    values of each column, using a sorted index on large sheets. A date range
+    on a qualified column without any dates reads its numbers as Excel date
+    serials.
+    """
+
+    row_level = True
+    HEADER_SCAN_ROWS = 10
+
+    def __init__(self, query, case_sensitive=False, fold_variants=False):
+        self.search_term = query
+        self.case_sensitive = case_sensitive
+        self.fold_variants = fold_variants
+        self.tree = self._bind(plan_query(parse_query(query)))
+        self.qualified = self._has_qualifier(self.tree)
+        self.column_names = {normalize_text(leaf[1]).strip() for leaf in self._leaves(self.tree) if leaf[1] is not None}
+        self.timed_out = False
+
+        # Literals a matching row must contain at least one of (None if no such set)
+        self.required = self._required_terms(self.tree)
+        self.streams = not self.qualified and self.required is not None
+        self.index_terms = []
+        if self.required is not None:
+            for term_matcher in self.required:
+                if not term_matcher.index_terms:
+                    self.index_terms = []
+                    break
+                self.index_terms.extend(term_matcher.index_terms)
+
+    def _bind(self, node):
+        """Attach a LiteralMatcher to every term"""
+        if node[0] == 'term':
+            return ('term', node[1], node[2], LiteralMatcher(node[2], self.case_sensitive, self.fold_variants))
+        if node[0] == 'range':
+            return ('range', node[1], node[2], ValueRange.parse(node[2]))
+        if node[0] == 'not':
+            return ('not', self._bind(node[1]))
+        return (node[0], [self._bind(child) for child in node[1]])
+
+    def _leaves(self, node):
+        if node[0] in ('term', 'range'):
+            return [node]
+        if node[0] == 'not':
+            return self._leaves(node[1])
+        return [leaf for child in node[1] for leaf in self._leaves(child)]
+
+    def _has_qualifier(self, node):
+        if node[0] in ('term', 'range'):
+            return node[1] is not None
+        if node[0] == 'not':
+            return self._has_qualifier(node[1])
+        return any(self._has_qualifier(child) for child in node[1])
+
+    def _required_terms(self, node):
+        if node[0] == 'term':
+            return [node[3]]
+        if node[0] in ('not', 'range'):
+            return None
+        sets = [self._required_terms(child) for child in node[1]]
+        if node[0] == 'and':
+            sets = [terms for terms in sets if terms is not None]
+            return min(sets, key=len) if sets else None
+        if any(terms is None for terms in sets):
+            return None
+        return [term for terms in sets for term in terms]
+
+    def begin_file(self):
+        pass
+
+    def match_text(self, text):
+        """Whether a cell may belong to a matching row"""
+        if self.required is None:
+            return True
+        return any(term_matcher.match_text(text) for term_matcher in self.required)
+
+    def may_match_numeric(self):
+        if self.required is None:
+            return True
+        return any(term_matcher.may_match_numeric() for term_matcher in self.required)
+
+    def match_row(self, values):
+        """Evaluate an unqualified query on one row of cell texts"""
+        def evaluate(node):
+            if node[0] == 'term':
+                return node[3].match_row(values)
+            if node[0] == 'range':
+                return any(node[3].match_text(value) for value in values)
+            if node[0] == 'not':
+                return not evaluate(node[1])
+            if node[0] == 'and':
+                return all(evaluate(child) for child in node[1])
+            return any(evaluate(child) for child in node[1])
+
+        return any(values) and evaluate(self.tree)
+
+    def find_header(self, df):
+        """
+        (sheet row, [cell texts]) of the header row among the first rows of df:
+        the first one naming a qualified column, else the first non-empty one.
+        (None, []) for a sheet without any text up there.
+        """
+        top = df.iloc[:self.HEADER_SCAN_ROWS]
+        rows = [[str(value) for value in values] for values in top.to_numpy(dtype=object).tolist()]
+        for label, names in zip(top.index.tolist(), rows):
+            if any(normalize_text(name).strip() in self.column_names for name in names if name):
+                return label, names
+        for label, names in zip(top.index.tolist(), rows):
+            if any(names):
+                return label, names
+        return None, []
+
+    def _columns_for(self, column_name, header, width):
+        """Column positions a qualifier refers to: header text first, then column letters"""
+        if column_name is None:
+            return range(width)
+        wanted = normalize_text(column_name).strip()
+        positions = [position for position, name in enumerate(header) if normalize_text(name).strip() == wanted]
+        if not positions and re.fullmatch(r'[A-Za-z]{1,3}', column_name):
+            position = _column_index(column_name)
+            if position < width:
+                positions = [position]
+        return positions
+
+    def _range_column_hits(self, node, df, position, rows):
+        _, column_name, _, value_range = node
+        column = typed_columns(df)[position]
+        # A date range on a named column may also read numbers as date serials
+        values = column.values_for(value_range.kind, serial_dates=column_name is not None)
+        if len(rows) * 16 < len(df):
+            return value_range.contains(values[rows])
+        if len(df) >= SORTED_INDEX_MIN_ROWS:
+            inside = np.zeros(len(df), dtype=bool)
+            inside[column.rows_in_range(value_range, column_name is not None)] = True
+        else:
+            inside = value_range.contains(values)
+        return inside[rows]
+
+    def _leaf_column_hits(self, node, df, position, rows):
+        if node[0] == 'term':
+            return node[3]._column_hits(df, position, rows)
+        return self._range_column_hits(node, df, position, rows)
+
+    def _leaf_hits(self, node, df, header, rows):
+        """A term or range over its columns; each column only sees rows still unmatched"""
+        hits = np.zeros(len(rows), dtype=bool)
+        for position in self._columns_for(node[1], header, df.shape[1]):
+            pending = np.flatnonzero(~hits)
+            if not len(pending):
+                break
+            hits[pending] = self._leaf_column_hits(node, df, position, rows[pending])
+        return hits
+
+    def _evaluate(self, node, df, header, rows):
+        """Boolean array over rows (positions in df)"""
+        kind = node[0]
+        if kind in ('term', 'range'):
+            return self._leaf_hits(node, df, header, rows)
+        if kind == 'not':
+            return ~self._evaluate(node[1], df, header, rows)
+        if kind == 'and':
+            result = np.ones(len(rows), dtype=bool)
+            for child in node[1]:
+                alive = np.flatnonzero(result)
+                if not len(alive):
+                    break
+                result[alive] = self._evaluate(child, df, header, rows[alive])
+            return result
+        result = np.zeros(len(rows), dtype=bool)
+        for child in node[1]:
+            pending = np.flatnonzero(~result)
+            if not len(pending):
+                break
+            result[pending] = self._evaluate(child, df, header, rows[pending])
+        return result
+
+    def row_mask(self, df, header=None):
+        """
+        Rows of df matching the query. header is find_header(df) by default;
+        the index passes it separately with only the candidate rows.
+        Empty rows never match, and with qualifiers neither do the header row
+        and the rows above it.
+        """
+        mask = np.zeros(len(df), dtype=bool)
+        if df.empty:
+            return mask
+        header_row, header = self.find_header(df) if header is None else header
+        text = df if all(pd.api.types.is_string_dtype(dtype) for dtype in df.dtypes) else df.astype(str)
+        candidates = (text != "").to_numpy().any(axis=1)
+        if self.qualified and header_row is not None:
+            candidates &= np.asarray(df.index) > header_row
+        rows = np.flatnonzero(candidates)
+        mask[rows] = self._evaluate(self.tree, df, header, rows)
+        return mask
+
+    def _positive_leaves(self, node, negated=False):
+        if node[0] in ('term', 'range'):
+            return [] if negated else [node]
+        if node[0] == 'not':
+            return self._positive_leaves(node[1], not negated)
+        return [leaf for child in node[1] for leaf in self._positive_leaves(child, negated)]
+
+    def cell_hits(self, df, header=None, rows=None):
+        """
+        Cells of rows (the matching rows) holding a term or range of the query
+        that is not under a NOT. A row matched only through a NOT has no such
+        cell and gets a single entry with column -1 (the whole row).
+        """
+        rows = np.arange(len(df)) if rows is None else np.asarray(rows, dtype=np.int64)
+        _, header = self.find_header(df) if header is None else header
+        covered = np.zeros(len(rows), dtype=bool)
+        hit_rows = [np.zeros(0, dtype=np.int64)]
+        hit_cols = [np.zeros(0, dtype=np.int64)]
+        for position in range(df.shape[1]):
+            hits = np.zeros(len(rows), dtype=bool)
+            for leaf in self._positive_leaves(self.tree):
+                if position in self._columns_for(leaf[1], header, df.shape[1]):
+                    pending = np.flatnonzero(~hits)
+                    hits[pending] = self._leaf_column_hits(leaf, df, position, rows[pending])
+            covered |= hits
+            hit_rows.append(rows[hits])
+            hit_cols.append(np.full(int(hits.sum()), position, dtype=np.int64))
+        hit_rows.append(rows[~covered])
+        hit_cols.append(np.full(int((~covered).sum()), -1, dtype=np.int64))
+        return np.concatenate(hit_rows), np.concatenate(hit_cols)
+
+def split_terms(text):
+    """Split a pasted term list on line breaks, tabs and semicolons"""
+    return [term.strip() for term in re.split(r"[\r\n\t;；]+", text) if term.strip()]
+
+def load_term_list(file_path):
+    """Terms from a text file (one per line) or the first column of a workbook"""
+    if Path(file_path).suffix.lower() in ('.xlsx', '.xlsm', '.xls'):
+        with WorkbookSession(file_path) as session:
+            df = session.read_sheet(session.sheet_names[0])
+        return [term.strip() for term in df.iloc[:, 0].tolist() if term.strip()] if df.shape[1] else []
+    with open(file_path, 'rb') as handle:
+        raw = handle.read()
+    for encoding in ('utf-8-sig', 'gb18030'):
+        try:
+            return split_terms(raw.decode(encoding))
+        except UnicodeDecodeError:
+            continue
+    return split_terms(raw.decode('utf-8', errors='replace'))
+
+def make_matcher(search_term, case_sensitive=False, mode='literal', max_distance=1, fold_variants=False):
+    """
+    Build the matcher for a search mode ('literal', 'multi', 'regex', 'fuzzy'
+    or 'query'). fold_variants also matches traditional against simplified
+    Chinese (not in regex mode). Raises ValueError for an unusable regex
+    pattern, fuzzy term or query.
+    """
+    if fold_variants and not variant_folding_available():
+        raise ValueError("繁简通用需要安装 opencc")
+    if mode == 'query':
+        return QueryMatcher(search_term, case_sensitive, fold_variants)
+    if mode == 'fuzzy':
+        return FuzzyMatcher(search_term, case_sensitive, max_distance, fold_variants)
+    if mode == 'multi':
+        terms = split_terms(search_term) if isinstance(search_term, str) else list(search_term)
+        return MultiTermMatcher(terms, case_sensitive, fold_variants)
+    if mode == 'regex':
+        return RegexMatcher(search_term, case_sensitive)
+    return LiteralMatcher(search_term, case_sensitive, fold_variants)
+
+def benchmark_row_matchers(rows=200000, columns=10, search_term="needle"):
+    """
+    Micro-benchmark: the old per-row df.apply lambda against LiteralMatcher
+    on a synthetic text frame. Both masks are checked to be identical.
+    """
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 10 ** 8, size=(rows, columns)).astype(str).astype(object)
+    data[rng.integers(0, rows, size=rows // 100), rng.integers(0, columns, size=rows // 100)] = search_term
+    df = pd.DataFrame(data, dtype=str)
+
+    start = time.perf_counter()
+    legacy_mask = df.apply(
+        lambda row: row.astype(str).str.contains(
+            search_term,
+            case=False,
+            regex=False,
+            na=False
+        ).any(),
+        axis=1
+    ).to_numpy(dtype=bool)
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vector_mask = LiteralMatcher(search_term).row_mask(df)
+    vector_seconds = time.perf_counter() - start
+
+    if not np.array_equal(legacy_mask, vector_mask):
+        raise AssertionError("向量化匹配结果与逐行匹配结果不一致")
+
+    return {
+        'rows': rows,
+        'columns': columns,
+        'hits': int(vector_mask.sum()),
+        'legacy_seconds': legacy_seconds,
+        'vector_seconds': vector_seconds,
+        'speedup': legacy_seconds / vector_seconds if vector_seconds else float('inf')
+    }
+
+
+def benchmark_fuzzy_matcher(rows=100000, columns=10, search_term="needle", max_distance=1):
+    """
+    Worst case for FuzzyMatcher: every row holds a near variant of the term.
+    Times frame_hits (mask, cells and distances) on the first query, which
+    also builds the normalized columns, and on a repeat query over the same
+    frame, as for a sheet kept in the SheetCache.
+    """
+    from sheetsearch.results import frame_hits
+
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 10 ** 8, size=(rows, columns)).astype(str).astype(object)
+    variants = np.array([
+        search_term, search_term[:-1], search_term + "s 5", "a " + search_term,
+        search_term[0] + search_term[2:], search_term[:2] + search_term[1:],
+        search_term.capitalize() + " box"
+    ], dtype=object)
+    suffixes = " " + rng.integers(0, 1000, size=rows).astype(str).astype(object)
+    data[np.arange(rows), rng.integers(0, columns, size=rows)] = variants[rng.integers(0, len(variants), size=rows)] + suffixes
+    df = pd.DataFrame(data, dtype=str)
+
+    start = time.perf_counter()
+    hits = frame_hits("bench", df, FuzzyMatcher(search_term, max_distance=max_distance))
+    first_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    frame_hits("bench", df, FuzzyMatcher(search_term, max_distance=max_distance))
+    cached_seconds = time.perf_counter() - start
+
+    return {
+        'rows': rows,
+        'columns': columns,
+        'hits': len(hits.rows) if hits is not None else 0,
+        'first_seconds': first_seconds,
+        'cached_seconds': cached_seconds
+    }
@@ -0,0 +1,21 @@
+"""
+Search options shared by the GUI, the command line and the search itself:
+the mode tables and defaults. Cheap to import, so a window or --help can be
+built before pandas is loaded.
+"""
+import os
+
+from sheetsearch.engines import is_package_installed
+
+SEARCH_MODES = {'普通': 'literal', '多词': 'multi', '正则': 'regex', '模糊': 'fuzzy', '查询': 'query'}
+
+# How far a search runs: everything, the first N rows, one hit per file, or counts only
+STOP_MODES = {'全部结果': None, '前N条': 'first', '仅判断包含': 'exists', '仅计数': 'count'}
+
+def variant_folding_available():
+    """Traditional/simplified folding needs the optional opencc package"""
+    return is_package_installed('opencc')
+
+def default_worker_count():
+    """Worker processes for parallel search: all cores but one, at least one"""
+    return max(1, (os.cpu_count() or 1) - 1)
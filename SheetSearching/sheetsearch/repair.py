@@ -0,0 +1,90 @@
+"""Last-resort readers for damaged workbooks"""
+import os
+import tempfile
+import shutil
+
+from sheetsearch.engines import WorkbookSession
+
+def read_problematic_excel(file_path):
+    """
+    Special method for handling problematic Excel files by creating a temporary copy.
+    This simulates the "copy-paste to new file" approach that fixed the original issue.
+    """
+    tmp_path = None
+    try:
+        # Create a temporary file
+        with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as tmp_file:
+            tmp_path = tmp_file.name
+
+        # Copy the original file to the temporary location
+        shutil.copy2(file_path, tmp_path)
+
+        # Read every sheet of the temporary copy from a single handle
+        with WorkbookSession(tmp_path) as session:
+            results = dict(session.iter_sheets())
+
+        # Clean up the temporary file
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+        return results
+
+    except Exception as e:
+        # Clean up if still exists
+        if tmp_path and os.path.exists(tmp_path):
+            try:
+                os.unlink(tmp_path)
+            except:
+                pass
+        raise e
+
+def repair_excel_with_com(file_path):
+    """
+    Repair Excel file using Excel's COM interface.
+    This simulates opening the file in Excel and saving it as a new file.
+    """
+    try:
+        import win32com.client
+    except ImportError:
+        raise ImportError("需要安装pywin32库才能进行Excel修复。请运行: pip install pywin32")
+
+    tmp_path = None
+    excel_app = None
+
+    try:
+        # Create a temporary file path for the repaired file
+        tmp_fd, tmp_path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(tmp_fd)
+
+        # Create Excel application
+        excel_app = win32com.client.Dispatch("Excel.Application")
+        excel_app.DisplayAlerts = False  # Don't show alerts
+        excel_app.Visible = False        # Don't show Excel
+
+        # Open the problematic file
+        workbook = excel_app.Workbooks.Open(os.path.abspath(file_path))
+
+        # Save as new file (this is the repair step)
+        workbook.SaveAs(os.path.abspath(tmp_path))
+        workbook.Close()
+
+        # Read the repaired file with pandas, opening it only once
+        with WorkbookSession(tmp_path) as session:
+            results = dict(session.iter_sheets())
+
+        return results
+
+    except Exception as e:
+        raise Exception(f"Excel COM修复失败: {str(e)}")
+
+    finally:
+        # Clean up resources
+        if excel_app:
+            excel_app.Quit()
+
+        # Clean up the temporary file
+        if tmp_path and os.path.exists(tmp_path):
+            try:
+                os.unlink(tmp_path)
+            except:
+                pass
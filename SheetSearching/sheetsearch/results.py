@@ -0,0 +1,194 @@
+"""Cell-level hit results (SheetHits) and matching parsed sheets into them"""
+import pandas as pd
+import numpy as np
+import threading
+
+from sheetsearch.columns import column_letter
+
+class SheetHits:
+    """
+    Hits of one sheet as cell coordinates instead of copied rows: parallel int32
+    arrays with the sheet row and column of every matching cell (column -1
+    stands for a row matched as a whole), and the matching rows in display
+    order. Apart from a short preview of the first rows, row contents are not
+    kept; load_rows() fetches them from the source when they are shown or
+    exported. tags holds extra per-row columns ({name: [text, ...]}, in
+    display order), such as the matched terms or the edit distance.
+    """
+
+    PREVIEW_ROWS = 200
+    LOADED_ROWS_LIMIT = 20000
+
+    def __init__(self, sheet_name, rows, cell_rows, cell_cols, width, tags=None, preview=None, source=None):
+        self.sheet_name = sheet_name
+        self.rows = np.asarray(rows, dtype=np.int32)
+        cell_rows = np.asarray(cell_rows, dtype=np.int32)
+        cell_cols = np.asarray(cell_cols, dtype=np.int32)
+        order = np.lexsort((cell_cols, cell_rows))
+        self.cell_rows = cell_rows[order]
+        self.cell_cols = cell_cols[order]
+        self.width = width
+        self.tags = tags or {}
+        self.source = source
+        self.loaded = dict(preview or {})
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def cell_count(self):
+        return int(np.count_nonzero(self.cell_cols >= 0))
+
+    def addresses(self):
+        """A1 addresses of the hit cells ('5:5' for a whole row)"""
+        return [f"{column_letter(col)}{row + 1}" if col >= 0 else f"{row + 1}:{row + 1}"
+                for row, col in zip(self.cell_rows.tolist(), self.cell_cols.tolist())]
+
+    def row_hit_columns(self, row):
+        """Columns of the hit cells in one sheet row"""
+        start, stop = np.searchsorted(self.cell_rows, [row, row + 1])
+        return [col for col in self.cell_cols[start:stop].tolist() if col >= 0]
+
+    def first_address(self, position):
+        """A1 address of the first hit cell of the row at display position"""
+        row = int(self.rows[position])
+        columns = self.row_hit_columns(row)
+        return f"{column_letter(columns[0] if columns else 0)}{row + 1}"
+
+    def rows_loaded(self, start=0, stop=None):
+        """Whether load_rows(start, stop) can answer without reading the source"""
+        with self.lock:
+            return all(row in self.loaded for row in self.rows[start:stop].tolist())
+
+    def load_rows(self, start=0, stop=None):
+        """
+        Rows start..stop (display positions) as a DataFrame indexed by sheet row,
+        with the tag columns first. Rows not loaded yet are read from the source
+        in one call.
+        """
+        rows = self.rows[start:stop].tolist()
+        with self.lock:
+            missing = [row for row in rows if row not in self.loaded]
+            if missing:
+                if self.source is None:
+                    raise ValueError(f"[{self.sheet_name}] 结果行无法读取: 没有数据来源")
+                if len(self.loaded) + len(missing) > self.LOADED_ROWS_LIMIT:
+                    self.loaded.clear()
+                block = self.source.load(self.sheet_name, missing, self.width)
+                self.loaded.update(zip(missing, block))
+            data = [self.loaded[row] for row in rows]
+
+        df = pd.DataFrame(data, index=rows, columns=range(self.width), dtype=str)
+        for position, (name, values) in enumerate(self.tags.items()):
+            df.insert(position, name, pd.Series(values[start:stop], index=rows, dtype=str))
+        return df
+
+    def to_frame(self):
+        """All matching rows, e.g. for export"""
+        return self.load_rows(0, len(self))
+
+    def head(self, count):
+        """The first count rows (display order) with their cells"""
+        if count >= len(self):
+            return self
+        rows = self.rows[:count]
+        keep = np.isin(self.cell_rows, rows)
+        head = SheetHits(
+            self.sheet_name, rows, self.cell_rows[keep], self.cell_cols[keep], self.width,
+            {name: values[:count] for name, values in self.tags.items()},
+            {row: self.loaded[row] for row in rows.tolist() if row in self.loaded},
+            self.source
+        )
+        return head
+
+def hit_row_count(file_results):
+    """Matching rows over all sheets of a file result"""
+    if "error" in file_results:
+        return 0
+    return sum(len(sheet_hits) for sheet_hits in file_results.values())
+
+def iter_results(results):
+    """
+    Flatten search_excel_files results into (file_path, sheet_name, SheetHits),
+    in result order. Files that could not be searched are left out; see
+    failed_files().
+    """
+    for file_path, file_results in results.items():
+        if "error" in file_results:
+            continue
+        for sheet_name, sheet_hits in file_results.items():
+            yield file_path, sheet_name, sheet_hits
+
+def failed_files(results):
+    """{file_path: error message} for the files of results that could not be searched"""
+    return {file_path: file_results["error"] for file_path, file_results in results.items() if "error" in file_results}
+
+def frame_hits(sheet_name, df, matcher, header=None, row_limit=None, count_only=False, matched=False):
+    """
+    Match one sheet (df indexed by sheet row) and return its SheetHits, or None
+    if nothing matched. Row-level matchers take the header row, as
+    (sheet row, [cell texts]), separately when df holds only some rows of the sheet. matched says every row of df already
+    matched (rows found by a streaming engine). Only the first row_limit
+    matching rows are kept; count_only keeps just the matching rows, without
+    locating cells, tags or a preview.
+    """
+    if matched:
+        positions = np.arange(len(df))
+    elif getattr(matcher, 'row_level', False):
+        if header is None:
+            header = matcher.find_header(df)
+        positions = np.flatnonzero(matcher.row_mask(df, header))
+    else:
+        positions = np.flatnonzero(matcher.row_mask(df))
+    if row_limit is not None:
+        positions = positions[:row_limit]
+    if not len(positions):
+        return None
+
+    labels = np.asarray(df.index, dtype=np.int64)
+    if count_only:
+        return SheetHits(sheet_name, labels[positions], labels[positions], np.full(len(positions), -1), df.shape[1])
+    cell_positions, cell_cols = matcher.cell_hits(df, header, positions)
+    matched = df.iloc[positions]
+    tags = None
+    if hasattr(matcher, 'annotate'):
+        # annotate() adds the tag column and may reorder the rows
+        annotated = matcher.annotate(df, positions)
+        tags = {matcher.TAG_COLUMN: annotated[matcher.TAG_COLUMN].tolist()}
+        matched = annotated.drop(columns=matcher.TAG_COLUMN)
+    preview = matched.iloc[:SheetHits.PREVIEW_ROWS]
+    return SheetHits(
+        sheet_name,
+        np.asarray(matched.index, dtype=np.int64),
+        labels[cell_positions],
+        cell_cols,
+        df.shape[1],
+        tags,
+        dict(zip(preview.index.tolist(), preview.to_numpy(dtype=object).tolist()))
+    )
+
+def iter_sheet_hits(sheets, matcher, row_limit=None, count_only=False, matched=False):
+    """
+    Run matcher over (sheet_name, df) pairs and yield (sheet_name, SheetHits)
+    for each matching sheet as soon as it is matched, stopping after row_limit
+    rows (see frame_hits). sheets may be a generator, so a sheet is only read
+    once the previous one has been handed on.
+    """
+    remaining = row_limit
+    for sheet_name, df in sheets:
+        if remaining is not None and remaining <= 0:
+            break
+        hits = frame_hits(sheet_name, df, matcher, None, remaining, count_only, matched)
+        if hits is not None:
+            if remaining is not None:
+                remaining -= len(hits)
+            yield sheet_name, hits
@@ -0,0 +1,380 @@
+"""Engines that search a workbook while streaming it instead of parsing whole sheets"""
+import pandas as pd
+import time
+import re
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+
+from sheetsearch.engines import cell_to_text, openpyxl_cell_text
+from sheetsearch.columns import _column_index
+
+def scan_workbook_streaming(file_path, matcher, sheet_errors=None, stats=None, row_limit=None, count_only=False):
+    """
+    Search a workbook with openpyxl in read-only mode without building a DataFrame
+    per sheet. Rows are tested as they stream by and only the matching rows are
+    kept, so memory stays flat regardless of sheet size.
+    Returns {sheet_name: DataFrame of matching rows}, indexed by row position.
+    Reading stops once row_limit rows matched; with count_only the frames have
+    no columns, only the matching row positions.
+    """
+    return dict(iter_workbook_streaming(file_path, matcher, sheet_errors, stats, row_limit, count_only))
+
+def iter_workbook_streaming(file_path, matcher, sheet_errors=None, stats=None, row_limit=None, count_only=False):
+    """
+    Generator form of scan_workbook_streaming: yields (sheet_name, DataFrame)
+    as each sheet is scanned. stats is filled once the last sheet is done;
+    closing the generator early closes the workbook.
+    """
+    from openpyxl import load_workbook
+
+    start = time.perf_counter()
+    workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    open_seconds = time.perf_counter() - start
+
+    remaining = row_limit
+    start = time.perf_counter()
+    try:
+        for worksheet in workbook.worksheets:
+            if remaining is not None and remaining <= 0:
+                break
+            found = None
+            try:
+                index = []
+                rows = []
+                width = 0
+                for row_idx, row in enumerate(worksheet.iter_rows()):
+                    values = [openpyxl_cell_text(cell) for cell in row]
+                    # Trailing empty cells are dropped, as pandas does
+                    while values and values[-1] == "":
+                        values.pop()
+                    width = max(width, len(values))
+
+                    if values and matcher.match_row(values):
+                        index.append(row_idx)
+                        if not count_only:
+                            rows.append(values)
+                        if remaining is not None and len(index) >= remaining:
+                            break
+
+                if remaining is not None:
+                    remaining -= len(index)
+                if count_only and index:
+                    found = pd.DataFrame(index=index)
+                elif rows:
+                    rows = [values + [""] * (width - len(values)) for values in rows]
+                    found = pd.DataFrame(rows, index=index, dtype=str)
+
+            except Exception as e:
+                if sheet_errors is None:
+                    raise
+                sheet_errors.append(f"[{worksheet.title}] {str(e)}")
+            if found is not None:
+                yield worksheet.title, found
+    finally:
+        workbook.close()
+
+    if stats is not None:
+        sheet_count = len(workbook.worksheets)
+        stats.update({
+            'engine': 'openpyxl-stream',
+            'sheets': sheet_count,
+            'open_seconds': open_seconds,
+            'parse_seconds': time.perf_counter() - start,
+            'saved_seconds': open_seconds * max(sheet_count - 1, 0)
+        })
+
+# Cell types whose text is stored in the sheet XML itself rather than in sharedStrings
+XLSX_TEXT_CELL_MARKER = re.compile(rb"""\bt=["'](?:inlineStr|str|b)["']""")
+
+def _xml_local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def _xml_text(element):
+    """Concatenate <t> text of a shared/inline string, skipping phonetic runs"""
+    parts = []
+    for child in element:
+        name = _xml_local_name(child.tag)
+        if name == 't':
+            parts.append(child.text or "")
+        elif name == 'r':
+            for run_child in child:
+                if _xml_local_name(run_child.tag) == 't':
+                    parts.append(run_child.text or "")
+    return "".join(parts)
+
+def _zip_part_path(base_dir, target):
+    if target.startswith('/'):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(base_dir, target))
+
+def _read_relationships(archive, part_path):
+    """{Id: (Type, absolute part path)} for a part's .rels file ('' for the package)"""
+    base_dir, name = posixpath.split(part_path)
+    rels_path = posixpath.join(base_dir, '_rels', name + '.rels')
+    if rels_path not in archive.namelist():
+        return {}
+    relationships = {}
+    for rel in ET.fromstring(archive.read(rels_path)):
+        if rel.get('TargetMode') == 'External':
+            continue
+        relationships[rel.get('Id')] = (rel.get('Type', ''), _zip_part_path(base_dir, rel.get('Target', '')))
+    return relationships
+
+def _read_date_styles(archive, styles_path):
+    """Return (date style ids, timedelta style ids) from styles.xml"""
+    from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+
+    date_styles = set()
+    timedelta_styles = set()
+    if not styles_path or styles_path not in archive.namelist():
+        return date_styles, timedelta_styles
+
+    root = ET.fromstring(archive.read(styles_path))
+    custom_formats = {}
+    cell_formats = []
+    for section in root:
+        name = _xml_local_name(section.tag)
+        if name == 'numFmts':
+            for num_fmt in section:
+                custom_formats[int(num_fmt.get('numFmtId'))] = num_fmt.get('formatCode', '')
+        elif name == 'cellXfs':
+            cell_formats = [int(xf.get('numFmtId', 0)) for xf in section]
+
+    for style_id, num_fmt_id in enumerate(cell_formats):
+        format_code = custom_formats.get(num_fmt_id, BUILTIN_FORMATS.get(num_fmt_id, 'General'))
+        if is_timedelta_format(format_code):
+            timedelta_styles.add(style_id)
+        elif is_date_format(format_code):
+            date_styles.add(style_id)
+    return date_styles, timedelta_styles
+
+def _sheet_has_text_cells(archive, part_path, chunk_size=1 << 20):
+    """Raw byte scan (no XML parsing) for inline/formula/boolean cells"""
+    overlap = b""
+    with archive.open(part_path) as stream:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return False
+            if XLSX_TEXT_CELL_MARKER.search(overlap + chunk):
+                return True
+            overlap = chunk[-16:]
+
+class XlsxSheetScanner:
+    """
+    Renders raw <c> elements of one workbook the way openpyxl/pandas would,
+    using the workbook's shared strings, date styles and epoch.
+    """
+
+    def __init__(self, shared_strings, date_styles, timedelta_styles, epoch):
+        self.shared_strings = shared_strings
+        self.date_styles = date_styles
+        self.timedelta_styles = timedelta_styles
+        self.epoch = epoch
+
+    def render(self, cell_type, style_id, raw):
+        from openpyxl.utils.datetime import from_excel, from_ISO8601
+
+        if raw is None:
+            return ""
+        if cell_type == 's':
+            return self.shared_strings[int(raw)]
+        if cell_type in ('inlineStr', 'str'):
+            return raw
+        if cell_type == 'e':
+            # Error cells are missing values to pandas, so they render empty
+            return ""
+        if cell_type == 'b':
+            return str(raw == '1')
+        if cell_type == 'd':
+            return cell_to_text(from_ISO8601(raw))
+
+        number = float(raw) if ('.' in raw or 'E' in raw or 'e' in raw) else int(raw)
+        if style_id in self.date_styles:
+            return cell_to_text(from_excel(number, self.epoch))
+        if style_id in self.timedelta_styles:
+            return cell_to_text(from_excel(number, self.epoch, timedelta=True))
+        return cell_to_text(number)
+
+def scan_xlsx_zip(file_path, matcher, sheet_errors=None, stats=None, row_limit=None, count_only=False):
+    """
+    Search an .xlsx straight from the zip with an incremental XML parser.
+    sharedStrings.xml is read first and the matching string indices collected,
+    so shared-string cells are tested with an integer lookup. If no shared string
+    matches, the term cannot occur in a number/date, and no sheet holds inline or
+    formula text, the workbook is skipped without parsing any sheet.
+    Returns {sheet_name: DataFrame of matching rows}, indexed by row position.
+    row_limit and count_only work as in scan_workbook_streaming.
+    """
+    return dict(iter_xlsx_zip(file_path, matcher, sheet_errors, stats, row_limit, count_only))
+
+def iter_xlsx_zip(file_path, matcher, sheet_errors=None, stats=None, row_limit=None, count_only=False):
+    """Generator form of scan_xlsx_zip, yielding (sheet_name, DataFrame) as each sheet is scanned"""
+    from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900
+
+    # .xls files can carry an embedded theme zip that zipfile happily opens,
+    # so insist on a zip signature at the start of the file
+    with open(file_path, 'rb') as handle:
+        if handle.read(4) != b'PK\x03\x04':
+            raise zipfile.BadZipFile("不是xlsx格式的文件")
+
+    start = time.perf_counter()
+    with zipfile.ZipFile(file_path) as archive:
+        # Locate the workbook part through the package relationships
+        workbook_path = 'xl/workbook.xml'
+        for rel_type, target in _read_relationships(archive, '').values():
+            if rel_type.endswith('/officeDocument'):
+                workbook_path = target
+        workbook_rels = _read_relationships(archive, workbook_path)
+
+        sheets = []
+        epoch = CALENDAR_WINDOWS_1900
+        workbook_root = ET.fromstring(archive.read(workbook_path))
+        if _xml_local_name(workbook_root.tag) != 'workbook':
+            raise ValueError("压缩包中没有SpreadsheetML工作簿")
+
+        for element in workbook_root.iter():
+            name = _xml_local_name(element.tag)
+            if name == 'workbookPr' and element.get('date1904') in ('1', 'true'):
+                epoch = CALENDAR_MAC_1904
+            elif name == 'sheet':
+                rel_id = next((value for key, value in element.attrib.items() if _xml_local_name(key) == 'id'), None)
+                rel_type, part_path = workbook_rels.get(rel_id, ('', ''))
+                if rel_type.endswith('/worksheet'):
+                    sheets.append((element.get('name'), part_path))
+
+        shared_strings_path = next((target for rel_type, target in workbook_rels.values() if rel_type.endswith('/sharedStrings')), None)
+        styles_path = next((target for rel_type, target in workbook_rels.values() if rel_type.endswith('/styles')), None)
+
+        # Pre-filter on the shared string table
+        shared_strings = []
+        matching_strings = set()
+        if shared_strings_path and shared_strings_path in archive.namelist():
+            with archive.open(shared_strings_path) as stream:
+                for event, element in ET.iterparse(stream, events=('end',)):
+                    if _xml_local_name(element.tag) == 'si':
+                        text = _xml_text(element)
+                        if matcher.match_text(text):
+                            matching_strings.add(len(shared_strings))
+                        shared_strings.append(text)
+                        element.clear()
+
+        numeric_possible = matcher.may_match_numeric()
+        date_styles, timedelta_styles = _read_date_styles(archive, styles_path)
+        scanner = XlsxSheetScanner(shared_strings, date_styles, timedelta_styles, epoch)
+        open_seconds = time.perf_counter() - start
+
+        skipped = 0
+        remaining = row_limit
+        start = time.perf_counter()
+        for sheet_name, part_path in sheets:
+            if remaining is not None and remaining <= 0:
+                break
+            result = None
+            try:
+                if not matching_strings and not numeric_possible and not _sheet_has_text_cells(archive, part_path):
+                    skipped += 1
+                    continue
+
+                result = _scan_xlsx_sheet(archive, part_path, scanner, matcher, matching_strings, numeric_possible,
+                                          remaining, count_only)
+
+            except Exception as e:
+                if sheet_errors is None:
+                    raise
+                sheet_errors.append(f"[{sheet_name}] {str(e)}")
+            if result is not None:
+                if remaining is not None:
+                    remaining -= len(result)
+                yield sheet_name, result
+
+    if stats is not None:
+        stats.update({
+            'engine': 'xlsx-zip',
+            'sheets': len(sheets),
+            'skipped_sheets': skipped,
+            'open_seconds': open_seconds,
+            'parse_seconds': time.perf_counter() - start,
+            'saved_seconds': open_seconds * max(len(sheets) - 1, 0)
+        })
+
+def _scan_xlsx_sheet(archive, part_path, scanner, matcher, matching_strings, numeric_possible,
+                     row_limit=None, count_only=False):
+    index = []
+    rows = []
+    width = 0
+    row_idx = -1
+    cells = []
+    cell_col = -1
+    sheet_data = None
+    candidate = False
+
+    with archive.open(part_path) as stream:
+        for event, element in ET.iterparse(stream, events=('start', 'end')):
+            name = _xml_local_name(element.tag)
+            if event == 'start':
+                if name == 'sheetData':
+                    sheet_data = element
+                elif name == 'row':
+                    row_number = element.get('r')
+                    row_idx = int(row_number) - 1 if row_number else row_idx + 1
+                    cells = []
+                    cell_col = -1
+                    candidate = False
+                continue
+
+            if name == 'c':
+                cell_ref = element.get('r')
+                cell_col = _column_index(cell_ref) if cell_ref else cell_col + 1
+                cell_type = element.get('t', 'n')
+                style_id = int(element.get('s', 0))
+                raw = None
+                for child in element:
+                    child_name = _xml_local_name(child.tag)
+                    if child_name == 'v':
+                        raw = child.text
+                    elif child_name == 'is':
+                        raw = _xml_text(child)
+
+                if raw is not None and raw != "":
+                    cells.append((cell_col, cell_type, style_id, raw))
+                    if not candidate:
+                        if cell_type == 's':
+                            # Integer lookup instead of comparing the string
+                            candidate = int(raw) in matching_strings
+                        elif cell_type in ('inlineStr', 'str', 'e', 'b') or numeric_possible:
+                            candidate = matcher.match_text(scanner.render(cell_type, style_id, raw))
+                element.clear()
+
+            elif name == 'row':
+                if cells:
+                    width = max(width, cells[-1][0] + 1)
+                if candidate:
+                    values = [""] * (cells[-1][0] + 1)
+                    for col, cell_type, style_id, raw in cells:
+                        values[col] = scanner.render(cell_type, style_id, raw)
+                    if matcher.match_row(values):
+                        index.append(row_idx)
+                        if not count_only:
+                            rows.append(values)
+                element.clear()
+                if sheet_data is not None:
+                    sheet_data.remove(element)
+                # Enough rows: the rest of the sheet is never parsed
+                if row_limit is not None and len(index) >= row_limit:
+                    break
+
+    if count_only:
+        return pd.DataFrame(index=index) if index else None
+    if not rows:
+        return None
+    rows = [values + [""] * (width - len(values)) for values in rows]
+    return pd.DataFrame(rows, index=index, dtype=str)
+
+# Engines that search a workbook directly instead of returning parsed sheets;
+# each yields (sheet_name, DataFrame of matching rows) as it finishes a sheet
+SCAN_ENGINES = {
+    'xlsx-zip': iter_xlsx_zip,
+    'openpyxl-stream': iter_workbook_streaming
+}
@@ -0,0 +1,451 @@
+"""Searching files: engine fallback per file, the streaming iter_search() and search_excel_files() on top of it"""
+import os
+import itertools
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from sheetsearch.engines import WorkbookSession, engine_key, learned_engine, remember_engines, route_engines
+from sheetsearch.matchers import MatchTimeout, make_matcher
+from sheetsearch.results import frame_hits, hit_row_count, iter_sheet_hits
+from sheetsearch.scanners import SCAN_ENGINES
+from sheetsearch.repair import read_problematic_excel, repair_excel_with_com
+from sheetsearch.cache import SheetCache
+from sheetsearch.index import IndexRowSource
+from sheetsearch.options import STOP_MODES
+
+def search_single_file(file_path, matcher, preferred_engine=None, row_limit=None, count_only=False):
+    """
+    Search one workbook with engine fallback and the repair steps.
+    Engines are routed by the sniffed file format and the engine that last
+    worked for this file. An engine that reads every sheet is a complete
+    answer even with zero hits, so no other engine or repair step is tried.
+    With row_limit the engines stop reading once that many rows matched;
+    count_only skips locating hit cells and keeping row previews.
+    Returns (file_results, file_stats): file_results is {sheet_name: SheetHits} for the
+    matching sheets (empty if nothing matched) or {"error": message}.
+    Module-level so it can run inside a process pool worker.
+    """
+    return _run_to_end(iter_file_search(file_path, matcher, preferred_engine, row_limit, count_only))
+
+def _run_to_end(generator):
+    """Exhaust a generator and return its return value"""
+    while True:
+        try:
+            next(generator)
+        except StopIteration as finished:
+            return finished.value
+
+def iter_file_search(file_path, matcher, preferred_engine=None, row_limit=None, count_only=False):
+    """
+    Generator form of search_single_file: yields (sheet_name, SheetHits) as soon
+    as each matching sheet is found and returns (file_results, file_stats) when
+    the file is done. A sheet is yielded once, even if a later engine has to
+    read the file again; if the file still fails, the return value carries the
+    error after its sheets were yielded. Closing the generator closes the
+    workbook without reading further sheets.
+    """
+    file_results = {}
+    file_stats = None
+    sheet_errors = []
+    last_error = ""
+    file_parsed = False
+    yielded = set()
+    matcher.begin_file()
+
+    # Step 1: Try the routed engines
+    for engine_config in route_engines(file_path, preferred_engine):
+        if matcher.timed_out:
+            break
+        engine = engine_config['engine']
+        options = engine_config['options']
+        errors_before = len(sheet_errors)
+
+        # Streaming engines only see rows one at a time, without the header
+        if engine in SCAN_ENGINES and not getattr(matcher, 'streams', True):
+            continue
+
+        attempt_results = {}
+        try:
+            if engine in SCAN_ENGINES:
+                engine_stats = {}
+                scanned = SCAN_ENGINES[engine](file_path, matcher, sheet_errors, engine_stats, row_limit, count_only)
+                for sheet_name, hits in iter_sheet_hits(scanned, matcher, row_limit, count_only, matched=True):
+                    attempt_results[sheet_name] = hits
+                    if sheet_name not in yielded:
+                        yielded.add(sheet_name)
+                        yield sheet_name, hits
+            else:
+                # 每个引擎只打开一次文件，所有表都从同一个句柄读取
+                with WorkbookSession(file_path, engine, options) as session:
+                    for sheet_name in session.sheet_names:
+                        # Enough hits: later sheets are not even parsed
+                        remaining = None if row_limit is None else row_limit - hit_row_count(attempt_results)
+                        if remaining is not None and remaining <= 0:
+                            break
+                        try:
+                            # 使用严格的文本模式读取数据
+                            df = session.read_sheet(sheet_name)
+                            hits = frame_hits(sheet_name, df, matcher, None, remaining, count_only)
+
+                        except Exception as e:
+                            sheet_errors.append(f"[{sheet_name}] {str(e)}")
+                            continue
+                        if hits is not None:
+                            attempt_results[sheet_name] = hits
+                            if sheet_name not in yielded:
+                                yielded.add(sheet_name)
+                                yield sheet_name, hits
+                engine_stats = session.stats()
+
+        except Exception as e:
+            last_error = str(e)
+            continue
+
+        # Partial results from a timed-out match are not an answer
+        if matcher.timed_out:
+            break
+
+        # 所有表都读取成功（即使没有命中）或者已有结果，都算解析成功
+        if attempt_results or len(sheet_errors) == errors_before:
+            file_results = attempt_results
+            file_stats = engine_stats
+            file_stats['engine_key'] = engine_key(engine_config)
+            file_parsed = True
+            break
+
+    # A spent match time budget fails the file; repairing it would not help
+    if matcher.timed_out:
+        return {"error": matcher.timeout_message}, None
+
+    # Step 2: If all standard approaches failed, try the temp file approach,
+    # then Step 3: Excel COM automation
+    for repair, label in ((read_problematic_excel, "常规修复尝试失败"), (repair_excel_with_com, "Excel COM修复尝试失败")):
+        if file_parsed:
+            break
+        try:
+            repaired_sheets = repair(file_path)
+
+            # Search in the repaired data
+            for sheet_name, hits in iter_sheet_hits(repaired_sheets.items(), matcher, row_limit, count_only):
+                file_results[sheet_name] = hits
+                if sheet_name not in yielded:
+                    yielded.add(sheet_name)
+                    yield sheet_name, hits
+            file_parsed = True
+
+        except Exception as e:
+            last_error = f"{last_error}; {label}: {str(e)}"
+
+    # Record errors if all attempts failed
+    if not file_parsed:
+        error_msg = last_error if last_error else "；".join(sheet_errors) if sheet_errors else "未知错误"
+        file_results = {"error": f"所有解析方式失败: {error_msg}"}
+
+    return file_results, file_stats
+
+def read_workbook_sheets(file_path, preferred_engine=None):
+    """
+    Parse every sheet of a workbook into a text DataFrame, for callers that keep
+    the parsed sheets (the caches). Uses the routed pandas engines, then the
+    repair steps. Returns (sheets, file_stats); raises if nothing can read it.
+    Module-level so it can run inside a process pool worker.
+    """
+    last_error = ""
+    for engine_config in route_engines(file_path, preferred_engine):
+        if engine_config['engine'] in SCAN_ENGINES:
+            continue
+        try:
+            with WorkbookSession(file_path, engine_config['engine'], engine_config['options']) as session:
+                sheets = dict(session.iter_sheets())
+            file_stats = session.stats()
+            file_stats['engine_key'] = engine_key(engine_config)
+            return sheets, file_stats
+        except Exception as e:
+            last_error = str(e)
+
+    for repair in (read_problematic_excel, repair_excel_with_com):
+        try:
+            return repair(file_path), None
+        except Exception as e:
+            last_error = f"{last_error}; {str(e)}"
+
+    raise Exception(f"所有解析方式失败: {last_error}")
+
+_ROW_CACHE = None
+
+def default_row_cache():
+    """Small in-memory SheetCache for showing result rows when searches run uncached"""
+    global _ROW_CACHE
+    if _ROW_CACHE is None:
+        _ROW_CACHE = SheetCache(max_mb=128)
+    return _ROW_CACHE
+
+class WorkbookRowSource:
+    """
+    Reads result rows back from the workbook for SheetHits.load_rows(). The
+    workbook is parsed once into a SheetCache (the search's own cache, or a
+    small default one), so further row blocks are only lookups.
+    """
+
+    def __init__(self, file_path, cache=None):
+        self.file_path = file_path
+        self.cache = cache
+
+    def load(self, sheet_name, rows, width):
+        cache = self.cache if self.cache is not None else default_row_cache()
+        sheets = cache.get(self.file_path)
+        if sheets is None:
+            sheets, _ = read_workbook_sheets(self.file_path, learned_engine(self.file_path))
+            cache.put(self.file_path, sheets)
+        df = sheets[sheet_name].reindex(index=rows, columns=range(width), fill_value="")
+        return df.to_numpy(dtype=object).tolist()
+
+def _replay(outcome):
+    """A finished (file_results, file_stats) outcome in the form of iter_file_search"""
+    file_results, file_stats = outcome
+    if "error" not in file_results:
+        yield from file_results.items()
+    return outcome
+
+def iter_search(file_paths, search_term, case_sensitive=False, workers=1, index=None, cache=None, mode='literal',
+                max_distance=1, fold_variants=False, stop=None, max_hits=100):
+    """
+    Search like search_excel_files, but yield events as the search goes instead
+    of returning everything at the end:
+        ("sheet", file_path, sheet_name, SheetHits)  a matching sheet
+        ("error", file_path, message)                a file that could not be searched
+        ("file", file_path, file_stats)              a file is done (file_stats may be None)
+    Every searched file ends with a "file" event after its sheets and error, so
+    counting them gives the progress. Searched in this process, each sheet is
+    yielded as soon as it is matched; pool workers hand over a file's sheets
+    together when they finish it. Only a few files are queued ahead of the
+    consumer, so memory stays bounded however many files there are.
+    Closing the generator (or breaking out of the loop) stops the search: the
+    workbook being read is closed and pool work not started yet is dropped.
+    """
+    if stop not in STOP_MODES.values():
+        raise ValueError(f"未知的结束方式: {stop}")
+    matcher = make_matcher(search_term, case_sensitive, mode, max_distance, fold_variants)
+    count_only = stop == 'count'
+    # Rows still wanted by the whole search; None without a corpus limit
+    remaining = max_hits if stop == 'first' else None
+    working_engines = {}
+
+    def file_row_limit():
+        return 1 if stop == 'exists' else remaining
+
+    def satisfied():
+        return remaining is not None and remaining <= 0
+
+    def file_events(file_path, searcher, source=None, learn=True):
+        nonlocal remaining
+        # Row contents are read back from the workbook (or the index) only when shown
+        source = source or WorkbookRowSource(file_path, cache)
+        taken = 0
+        try:
+            while True:
+                try:
+                    sheet_name, sheet_hits = next(searcher)
+                except StopIteration as finished:
+                    file_results, file_stats = finished.value
+                    break
+                except Exception as e:
+                    file_results, file_stats = {"error": str(e)}, None
+                    break
+                # Parallel workers and the index do not know what the others found
+                limit = 1 - taken if stop == 'exists' else remaining
+                if limit is not None:
+                    sheet_hits = sheet_hits.head(max(limit, 0))
+                if not len(sheet_hits):
+                    continue
+                taken += len(sheet_hits)
+                if remaining is not None:
+                    remaining -= len(sheet_hits)
+                sheet_hits.source = source
+                yield "sheet", file_path, sheet_name, sheet_hits
+        finally:
+            searcher.close()
+
+        if "error" in file_results:
+            yield "error", file_path, file_results["error"]
+        # A full parse for the cache skips the scan engines, so it says nothing
+        # about which engine a live search should start with
+        if learn and file_stats is not None and 'engine_key' in file_stats:
+            working_engines[file_path] = file_stats['engine_key']
+        yield "file", file_path, file_stats
+
+    def match_cached(file_path, sheets, file_stats):
+        matcher.begin_file()
+        file_results = {}
+        try:
+            for sheet_name, sheet_hits in iter_sheet_hits(sheets.items(), matcher, file_row_limit(), count_only):
+                file_results[sheet_name] = sheet_hits
+                yield sheet_name, sheet_hits
+        except MatchTimeout as e:
+            return {"error": str(e)}, file_stats
+        finally:
+            # Matching has built derived columns for the cached sheets
+            cache.remeasure(file_path)
+        return file_results, file_stats
+
+    def cache_and_match(file_path, sheets, file_stats):
+        cache.put(file_path, sheets)
+        return (yield from match_cached(file_path, sheets, file_stats))
+
+    def parse_and_match(file_path):
+        sheets, file_stats = read_workbook_sheets(file_path, learned_engine(file_path))
+        return (yield from cache_and_match(file_path, sheets, file_stats))
+
+    def caches(file_path):
+        # Early-stopping searches, first uses and files too large for the budget
+        # stay on the streaming engines, which can stop or skip a workbook early
+        return cache is not None and stop is None and cache.wants(file_path)
+
+    def pool_events(file_paths):
+        def submit(file_path):
+            if caches(file_path):
+                # The worker only parses; matching happens here
+                return executor.submit(read_workbook_sheets, file_path, learned_engine(file_path)), True
+            return executor.submit(search_single_file, file_path, matcher, learned_engine(file_path),
+                                   file_row_limit(), count_only), False
+
+        pool_size = min(workers, len(file_paths))
+        executor = ProcessPoolExecutor(max_workers=pool_size)
+        queued = iter(file_paths)
+        running = {}
+        try:
+            while True:
+                # A couple of files per worker in flight; finished ones wait for the consumer
+                for file_path in itertools.islice(queued, 2 * pool_size - len(running)):
+                    future, cached = submit(file_path)
+                    running[future] = (file_path, cached)
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if satisfied():
+                        # Files finishing after the stop are dropped, errors included,
+                        # as the sequential search never gets to them
+                        break
+                    file_path, cached = running.pop(future)
+                    try:
+                        outcome = future.result()
+                    except Exception as e:
+                        if not cached:
+                            # The worker process itself died (e.g. out of memory)
+                            outcome = ({"error": f"工作进程异常退出: {str(e)}"}, None)
+                        else:
+                            outcome = ({"error": str(e)}, None)
+                        searcher = _replay(outcome)
+                    else:
+                        searcher = cache_and_match(file_path, *outcome) if cached else _replay(outcome)
+                    yield from file_events(file_path, searcher, learn=not cached)
+                if satisfied():
+                    break
+        finally:
+            # Also reached when the consumer closes the generator: queued files
+            # are dropped, running ones finish their current file in the background
+            for future in running:
+                future.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    try:
+        all_paths = file_paths
+        if index is not None:
+            # The index answers all its files in one query, under one time budget
+            matcher.begin_file()
+            indexed_results, file_paths = index.search(all_paths, matcher, count_only)
+            unindexed = set(file_paths)
+            for file_path in all_paths:
+                if satisfied():
+                    return
+                if file_path not in unindexed:
+                    yield from file_events(file_path, _replay((indexed_results.get(os.path.abspath(file_path), {}), None)),
+                                           IndexRowSource(index.db_path, file_path))
+
+        if cache is not None:
+            # Cache hits only need matching; misses in repeat use are parsed in full and cached
+            missed = []
+            for file_path in file_paths:
+                if satisfied():
+                    return
+                sheets = cache.get(file_path)
+                if sheets is None:
+                    missed.append(file_path)
+                else:
+                    yield from file_events(file_path, match_cached(file_path, sheets, {'engine': 'memory-cache', 'saved_seconds': 0.0}))
+            file_paths = missed
+
+        if workers > 1 and len(file_paths) > 1:
+            yield from pool_events(file_paths)
+        else:
+            for file_path in file_paths:
+                if satisfied():
+                    return
+                if caches(file_path):
+                    yield from file_events(file_path, parse_and_match(file_path), learn=False)
+                else:
+                    searcher = iter_file_search(file_path, matcher, learned_engine(file_path), file_row_limit(), count_only)
+                    yield from file_events(file_path, searcher)
+    finally:
+        remember_engines(working_engines)
+
+def search_excel_files(file_paths, search_term, case_sensitive=False, stats=None, workers=1,
+                       on_file_done=None, cancel_event=None, index=None, cache=None, mode='literal',
+                       max_distance=1, fold_variants=False, stop=None, max_hits=100):
+    """
+    Search every sheet of every file for search_term.
+    Returns {file_path: {sheet_name: SheetHits}} (or {"error": message} for a
+    file), keyed by the paths as passed in: the coordinates of the hit cells, with the rows themselves read back
+    through SheetHits.load_rows() when needed.
+    mode selects the matcher (see make_matcher); in 'multi' mode search_term is
+    a list of terms or a pasted list, and result rows are tagged with the terms
+    they contain; in 'fuzzy' mode rows within max_distance edits are returned
+    with their distance, closest first.
+    Without case_sensitive, matching also ignores full-/half-width forms;
+    fold_variants additionally equates traditional and simplified Chinese.
+    With workers > 1 the files are spread over a process pool; engine fallback
+    and error reporting run inside each worker and the results are merged in
+    the order of file_paths.
+    If a stats dict is passed, it is filled with per-file load timings
+    ({file_path: WorkbookSession.stats()}), including the estimated time saved
+    by opening each workbook only once.
+    on_file_done(file_path, file_results, file_stats) is called as each file
+    finishes. Setting cancel_event (a threading.Event) stops the search at the
+    next sheet or file; files already finished are still returned.
+    With a SheetIndex, indexed and unchanged files are answered from the index
+    and only the remaining files are parsed.
+    With a SheetCache, files searched again in full (no stop) are parsed in full
+    once and kept, if they fit its budget; first searches, early-stopping ones
+    and larger files are streamed. Later searches over cached files only run
+    the matcher.
+    stop ends the search early (see STOP_MODES): 'first' stops the whole search
+    after max_hits matching rows, 'exists' stops each file at its first hit, and
+    'count' only counts the matching rows, without locating cells or keeping
+    rows. The engines stop reading a file as soon as its limit is reached.
+    Built on iter_search(), which yields the same results as they are found.
+    """
+    outcomes = {}
+    events = iter_search(file_paths, search_term, case_sensitive, workers, index, cache, mode,
+                         max_distance, fold_variants, stop, max_hits)
+    try:
+        for event in events:
+            kind, file_path = event[0], event[1]
+            file_results = outcomes.setdefault(file_path, {})
+            if kind == "sheet":
+                file_results[event[2]] = event[3]
+            elif kind == "error":
+                # A file that failed after some sheets matched is still a failure
+                file_results.clear()
+                file_results["error"] = event[2]
+            else:
+                file_stats = event[2]
+                if stats is not None and file_stats is not None:
+                    stats[file_path] = file_stats
+                if on_file_done is not None:
+                    on_file_done(file_path, file_results, file_stats)
+            if cancel_event is not None and cancel_event.is_set():
+                break
+    finally:
+        events.close()
+
+    return {file_path: outcomes[file_path] for file_path in file_paths if outcomes.get(file_path)}